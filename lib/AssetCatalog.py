@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+from bisect import bisect_right
+from CyberKnightAssetBanks import ASSETS
+
+# The catalog shared by everything in this process, once it is built
+CATALOG = None
+
+class AssetCatalog(object):
+	"""
+	The asset banks of CyberKnightAssetBanks.ASSETS, sorted by ROM address.
+
+	An asset can be assumed to run up to the start of the next highest asset
+	in its bank, or the end of the bank if it is the last one; that is its
+	limit. The limit and size of every asset are worked out once here, instead
+	of by each tool that needs them.
+
+	Each asset is described by a dictionary with the same keys as the asset
+	files written by extractAssets.py (but holding numbers, not hex strings):
+	bank, asset_index, asset_type, asset_rom_pointer_value,
+	asset_rom_pointer_address, asset_rom_pointer_address_limit and asset_size.
+	"""
+
+	def __init__(self, assets = ASSETS):
+		# Assets of each bank in address order, with their start addresses
+		self.bank_assets = {}
+		self.bank_starts = {}
+		# Assets of every bank in address order, with their start addresses
+		self.assets = []
+		self.starts = []
+		# Assets by (bank, asset_index)
+		self.by_index = {}
+
+		for bank in sorted(assets["asset_banks"].keys()):
+			asset_bank = assets["asset_banks"][bank]
+			bank_end = asset_bank["asset_bank_rom_end_address"]
+			bank_assets = sorted(asset_bank["assets"].values(), key = lambda a: (a["asset_rom_pointer_address"], a["asset_index"]))
+			starts = [a["asset_rom_pointer_address"] for a in bank_assets]
+			entries = []
+			for asset in bank_assets:
+				start = asset["asset_rom_pointer_address"]
+				# The next asset which starts above this one, or the end of the bank
+				i = bisect_right(starts, start)
+				if i < len(starts):
+					limit = starts[i]
+				else:
+					limit = bank_end
+				entry = {
+					"bank" : bank,
+					"asset_index" : asset["asset_index"],
+					"asset_type" : asset["asset_type"],
+					"asset_rom_pointer_value" : asset["asset_rom_pointer_value"],
+					"asset_rom_pointer_address" : start,
+					"asset_rom_pointer_address_limit" : limit,
+					"asset_size" : limit - start,
+				}
+				entries.append(entry)
+				self.by_index[(bank, asset["asset_index"])] = entry
+			self.bank_assets[bank] = entries
+			self.bank_starts[bank] = starts
+			self.assets += entries
+
+		self.assets.sort(key = lambda a: (a["asset_rom_pointer_address"], a["bank"], a["asset_index"]))
+		self.starts = [a["asset_rom_pointer_address"] for a in self.assets]
+
+	def __len__(self):
+		return len(self.assets)
+
+	def banks(self):
+		"""
+		The asset bank numbers, in order.
+		"""
+		return sorted(self.bank_assets.keys())
+
+	def get(self, bank, asset_index):
+		"""
+		The asset with the given bank and asset index, or None if there is no such asset.
+		"""
+		return self.by_index.get((bank, asset_index))
+
+	def text_assets(self):
+		"""
+		The text assets of every bank, by bank and then asset index.
+		"""
+		return [self.by_index[k] for k in sorted(self.by_index.keys()) if self.by_index[k]["asset_type"] == "text"]
+
+	def graphics_assets(self):
+		"""
+		The assets of every bank which are not text (the rest of the banks
+		hold graphics), by bank and then asset index.
+		"""
+		return [self.by_index[k] for k in sorted(self.by_index.keys()) if self.by_index[k]["asset_type"] != "text"]
+
+	def find(self, address, bank = None):
+		"""
+		The asset whose region contains a ROM address, or None if it is not
+		inside any asset. If a bank is given, only assets of that bank are
+		searched.
+		"""
+		if bank is None:
+			starts = self.starts
+			assets = self.assets
+		else:
+			starts = self.bank_starts[bank]
+			assets = self.bank_assets[bank]
+		i = bisect_right(starts, address) - 1
+		if i < 0:
+			return None
+		asset = assets[i]
+		if address < asset["asset_rom_pointer_address_limit"]:
+			return asset
+		return None
+
+	def next_asset(self, address, bank = None):
+		"""
+		The first asset which starts after a ROM address, or None if there is
+		none. If a bank is given, only assets of that bank are searched.
+		"""
+		if bank is None:
+			starts = self.starts
+			assets = self.assets
+		else:
+			starts = self.bank_starts[bank]
+			assets = self.bank_assets[bank]
+		i = bisect_right(starts, address)
+		if i < len(assets):
+			return assets[i]
+		return None
+
+def get_catalog():
+	"""
+	get_catalog - the asset catalog of CyberKnightAssetBanks.ASSETS, built on first use.
+	"""
+	global CATALOG
+	if CATALOG is None:
+		CATALOG = AssetCatalog()
+	return CATALOG
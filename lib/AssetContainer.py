@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+
+import os
+import json
+import zlib
+import struct
+
+# Asset files are either JSON (.dat) or the binary container (.cka)
+DAT_EXTENSION = ".dat"
+CONTAINER_EXTENSION = ".cka"
+
+#########################################################################
+# Binary asset container
+# ----------------------
+# All numbers are little endian. The file is a CONTAINER_HEADER (below),
+# followed by these sections, compressed together with zlib:
+#
+# asset       - UTF-8 JSON of the asset level fields (bank, asset_index...)
+# strings     - one CONTAINER_ROW per string
+# chunk       - the raw bytes of asset_chunk (files from extractAssets.py)
+# blob        - the raw bytes of every string, one after the other
+# text        - the text columns of every string, in UTF-8, separated by NUL
+# extra       - UTF-8 JSON of anything that does not fit the columns above
+#
+# A string field is only stored in its column if it has exactly the type
+# and form that the JSON asset files use (e.g. "bytes" as a list of two
+# digit lower case hex strings), so that reading a container gives back
+# exactly what reading the JSON file it came from would. Anything else is
+# kept in extra, by string position.
+#########################################################################
+
+CONTAINER_MAGIC = b"CKA\x01"
+
+# magic, flags, number of strings, then the size of the asset, chunk, blob, text and extra sections
+# (each before compression)
+CONTAINER_HEADER = struct.Struct("<4sIIIIIII")
+FLAG_CHUNK = 0x01
+FLAG_STRINGS = 0x02
+FLAG_TEXT = 0x04
+
+# Columns stored in the text section, in order
+TEXT_COLUMNS = ["PCE_japanese", "SNES_japanese", "SNES_english", "PCE_english", "notes"]
+
+# present bits, string_number, string_size, start_pos, length in the blob and
+# SNES_accuracy. Each string follows straight on from the one before it in the
+# blob, and its text columns (those that are present, in order) in the text.
+CONTAINER_ROW = struct.Struct("<IIIIId")
+
+# Bit of each column in the present bits of a row
+COLUMN_BITS = {
+	"string_number" : 0x001,
+	"string_size" : 0x002,
+	"start_pos" : 0x004,
+	"bytes" : 0x008,
+	"SNES_accuracy" : 0x010,
+}
+for i, column in enumerate(TEXT_COLUMNS):
+	COLUMN_BITS[column] = 0x020 << i
+TEXT_BITS = sum([COLUMN_BITS[column] for column in TEXT_COLUMNS])
+ALL_BITS = sum(COLUMN_BITS.values())
+
+TEXT_TYPE = type(u"")
+HEX_BYTES = ["%02x" % i for i in range(0, 256)]
+
+def is_uint32(value):
+	return (type(value) is int) and (0 <= value < 0x100000000)
+
+def hex_string_value(value):
+	"""
+	The number of a hex string as written by hex() (e.g. '0x1400b'), or None if it is not one.
+	"""
+	if type(value) is not TEXT_TYPE:
+		return None
+	try:
+		number = int(value, 16)
+	except ValueError:
+		return None
+	if (value != hex(number)) or not is_uint32(number):
+		return None
+	return number
+
+def hex_list_bytes(value):
+	"""
+	The bytes of a list of two digit lower case hex strings, or None if it is not one.
+	A bytearray (as given by unpack_asset() with raw_bytes) is taken as it is.
+	"""
+	if type(value) is bytearray:
+		return value
+	if type(value) is not list:
+		return None
+	try:
+		codes = bytearray([int(c, 16) for c in value])
+	except (TypeError, ValueError):
+		return None
+	for i in range(0, len(codes)):
+		if value[i] != HEX_BYTES[codes[i]]:
+			return None
+	return codes
+
+def as_text(text):
+	"""
+	Text as unicode, the same as it reads back from a JSON asset file (Python 2
+	tools hold some of their text as UTF-8 byte strings).
+	"""
+	if isinstance(text, bytes):
+		return text.decode("utf-8")
+	return text
+
+def pack_asset(asset):
+	"""
+	pack_asset - the binary container of an asset, as loaded from a JSON asset
+	file ("bytes" and "asset_chunk" may also be bytearrays, as for raw_bytes).
+	"""
+	fields = {}
+	flags = 0
+	chunk = bytearray()
+	for k in asset.keys():
+		if k == "asset_chunk":
+			codes = hex_list_bytes(asset[k])
+			if codes is not None:
+				chunk = codes
+				flags |= FLAG_CHUNK
+				continue
+		if k == "strings" and type(asset[k]) is list and all(type(s) is dict for s in asset[k]):
+			flags |= FLAG_STRINGS
+			continue
+		fields[k] = asset[k]
+
+	rows = []
+	blob = bytearray()
+	text = []
+	extra = {}
+	strings = asset["strings"] if (flags & FLAG_STRINGS) else []
+	for i, string in enumerate(strings):
+		present = 0
+		string_blob = b""
+		string_text = [None] * len(TEXT_COLUMNS)
+		row = [0, 0, 0, 0, 0, 0.0]
+		for k, v in string.items():
+			if k in ["string_number", "string_size"] and is_uint32(v):
+				row[1 if k == "string_number" else 2] = v
+			elif k == "start_pos" and hex_string_value(v) is not None:
+				row[3] = hex_string_value(v)
+			elif k == "bytes" and hex_list_bytes(v) is not None:
+				string_blob = hex_list_bytes(v)
+				row[4] = len(string_blob)
+			elif k == "SNES_accuracy" and type(v) is float:
+				row[5] = v
+			elif k in TEXT_COLUMNS and type(v) is TEXT_TYPE and u"\x00" not in v:
+				string_text[TEXT_COLUMNS.index(k)] = v
+			else:
+				extra.setdefault(str(i), {})[k] = v
+				continue
+			present |= COLUMN_BITS[k]
+		row[0] = present
+		rows.append(CONTAINER_ROW.pack(*row))
+		blob += string_blob
+		text += [v for v in string_text if v is not None]
+
+	asset_json = json.dumps(fields, ensure_ascii = False).encode("utf-8")
+	extra_json = b""
+	if len(extra) > 0:
+		extra_json = json.dumps(extra, ensure_ascii = False).encode("utf-8")
+	if len(text) > 0:
+		flags |= FLAG_TEXT
+	text = u"\x00".join(text).encode("utf-8")
+	header = CONTAINER_HEADER.pack(CONTAINER_MAGIC, flags, len(rows), len(asset_json), len(chunk), len(blob), len(text), len(extra_json))
+	body = b"".join([asset_json] + rows + [bytes(chunk), bytes(blob), bytes(text), extra_json])
+	return header + zlib.compress(body, 6)
+
+def unpack_asset(data, raw_bytes = False):
+	"""
+	unpack_asset - an asset from its binary container, the same as if it had
+	been loaded from the JSON asset file it was made from.
+	
+	With raw_bytes, "bytes" and "asset_chunk" are bytearrays instead of lists
+	of hex strings (translators.hex_to_codes() takes either).
+	"""
+	(magic, flags, count, asset_size, chunk_size, blob_size, text_size, extra_size) = CONTAINER_HEADER.unpack_from(data, 0)
+	if magic != CONTAINER_MAGIC:
+		raise ValueError("Not an asset container")
+	data = zlib.decompress(data[CONTAINER_HEADER.size:])
+	pos = 0
+	asset = json.loads(bytes(data[pos:pos + asset_size]).decode("utf-8"))
+	pos += asset_size
+	rows_pos = pos
+	pos += count * CONTAINER_ROW.size
+	chunk = bytearray(data[pos:pos + chunk_size])
+	pos += chunk_size
+	blob = bytearray(data[pos:pos + blob_size])
+	pos += blob_size
+	text = []
+	if flags & FLAG_TEXT:
+		text = bytes(data[pos:pos + text_size]).decode("utf-8").split(u"\x00")
+	pos += text_size
+	extra = {}
+	if extra_size > 0:
+		extra = json.loads(bytes(data[pos:pos + extra_size]).decode("utf-8"))
+
+	if flags & FLAG_CHUNK:
+		if raw_bytes:
+			asset["asset_chunk"] = chunk
+		else:
+			asset["asset_chunk"] = [HEX_BYTES[c] for c in chunk]
+	if flags & FLAG_STRINGS:
+		strings = []
+		blob_pos = 0
+		text_pos = 0
+		for i in range(0, count):
+			row = CONTAINER_ROW.unpack_from(data, rows_pos + (i * CONTAINER_ROW.size))
+			present = row[0]
+			if present == ALL_BITS:
+				# Every column is there, which is nearly always the case
+				string_bytes = blob[blob_pos:blob_pos + row[4]]
+				if not raw_bytes:
+					string_bytes = [HEX_BYTES[c] for c in string_bytes]
+				blob_pos += row[4]
+				strings.append({
+					"string_number" : row[1],
+					"string_size" : row[2],
+					"start_pos" : TEXT_TYPE(hex(row[3])),
+					"bytes" : string_bytes,
+					"SNES_accuracy" : row[5],
+					"PCE_japanese" : text[text_pos],
+					"SNES_japanese" : text[text_pos + 1],
+					"SNES_english" : text[text_pos + 2],
+					"PCE_english" : text[text_pos + 3],
+					"notes" : text[text_pos + 4],
+				})
+				text_pos += 5
+				continue
+			string = {}
+			if present & 0x001:
+				string["string_number"] = row[1]
+			if present & 0x002:
+				string["string_size"] = row[2]
+			if present & 0x004:
+				string["start_pos"] = TEXT_TYPE(hex(row[3]))
+			if present & 0x008:
+				if raw_bytes:
+					string["bytes"] = blob[blob_pos:blob_pos + row[4]]
+				else:
+					string["bytes"] = [HEX_BYTES[c] for c in blob[blob_pos:blob_pos + row[4]]]
+				blob_pos += row[4]
+			if present & 0x010:
+				string["SNES_accuracy"] = row[5]
+			if present & TEXT_BITS:
+				for j, column in enumerate(TEXT_COLUMNS):
+					if present & (0x020 << j):
+						string[column] = text[text_pos]
+						text_pos += 1
+			strings.append(string)
+		for i in extra.keys():
+			strings[int(i)].update(extra[i])
+		asset["strings"] = strings
+	return asset
+
+def read_asset(file_name, raw_bytes = False):
+	"""
+	read_asset - load an asset file, in either the JSON or binary container
+	format. raw_bytes is as for unpack_asset(), and only applies to containers.
+	"""
+	f = open(file_name, "rb")
+	data = f.read()
+	f.close()
+	if data[:len(CONTAINER_MAGIC)] == CONTAINER_MAGIC:
+		return unpack_asset(data, raw_bytes)
+	return json.loads(data.decode("utf-8"))
+
+def write_asset(file_name, asset):
+	"""
+	write_asset - save an asset in the binary container format.
+	"""
+	f = open(file_name, "wb")
+	f.write(pack_asset(asset))
+	f.close()
+
+#########################################################################
+# JSON asset files
+# ----------------
+# The .dat files are laid out by hand, one field per line and one string
+# per block, so that changes to the script show up as small diffs. Text is
+# written as it is, other than line breaks (written as \n), which is how
+# the tools have always written it; the whole file is put together in
+# memory and written out in one go.
+#########################################################################
+
+# The asset level fields, in the order they are written (asset_size follows them)
+DAT_HEADER_FIELDS = ["bank", "asset_index", "asset_rom_pointer_value", "asset_rom_pointer_address", "asset_rom_pointer_address_limit"]
+
+def dat_text(text):
+	"""
+	Text as it is written in a JSON asset file.
+	"""
+	return as_text(text).replace(u"\n", u"\\n")
+
+def dat_hex_list(value):
+	"""
+	A list of hex byte codes (or a bytearray) as it is written in a JSON asset file.
+	"""
+	if type(value) is bytearray:
+		codes = [HEX_BYTES[c] for c in value]
+	else:
+		codes = [as_text(c).lower() for c in value]
+	return u"[" + u", ".join([u"\"%s\"" % c for c in codes]) + u"]"
+
+def dat_string(string):
+	"""
+	dat_string - one string of a JSON asset file, from its opening brace to
+	its closing one, as it is written in the strings list.
+	"""
+	return u"".join([
+		u"{\n",
+		u"\t\t\t\"string_number\" : %s,\n" % string["string_number"],
+		u"\t\t\t\"string_size\" : %s,\n" % string["string_size"],
+		u"\t\t\t\"start_pos\" : \"%s\",\n" % as_text(string["start_pos"]),
+		u"\t\t\t\"bytes\" : %s,\n" % dat_hex_list(string["bytes"]),
+		u"\t\t\t\"PCE_japanese\" : \"%s\",\n" % dat_text(string["PCE_japanese"]),
+		u"\t\t\t\"SNES_japanese\" : \"%s\",\n" % dat_text(string["SNES_japanese"]),
+		u"\t\t\t\"SNES_english\" : \"%s\",\n" % dat_text(string["SNES_english"]),
+		u"\t\t\t\"SNES_accuracy\" : %s,\n" % string["SNES_accuracy"],
+		u"\t\t\t\"PCE_english\" : \"%s\",\n" % dat_text(string["PCE_english"]),
+		u"\t\t\t\"notes\" : \"%s\"\n" % dat_text(string["notes"]),
+		u"\t\t}",
+	])
+
+def dump_dat(asset):
+	"""
+	dump_dat - the JSON asset file of an asset, as UTF-8 bytes. The asset
+	is as read back from a JSON file, with an asset_chunk (raw assets) or
+	strings (split and mapped assets); "bytes" and "asset_chunk" may also be
+	bytearrays, as for raw_bytes.
+	"""
+	out = [u"{\n"]
+	for k in DAT_HEADER_FIELDS:
+		out.append(u"\t\"%s\" : \"%s\",\n" % (k, as_text(asset[k])))
+	out.append(u"\t\"asset_size\" : %s,\n" % asset["asset_size"])
+	if "strings" not in asset:
+		out.append(u"\t\"asset_chunk\" : %s\n" % dat_hex_list(asset["asset_chunk"]))
+		out.append(u"}")
+		return u"".join(out).encode("utf-8")
+
+	out.append(u"\t\"strings\" : [\n")
+	out.append(u",\n".join([u"\t\t" + dat_string(string) for string in asset["strings"]]))
+	out.append(u"\n\t]\n}")
+	return u"".join(out).encode("utf-8")
+
+def write_dat(file_name, asset):
+	"""
+	write_dat - save an asset as a JSON asset file.
+	"""
+	f = open(file_name, "wb")
+	f.write(dump_dat(asset))
+	f.close()
+
+def save_asset(file_name, asset):
+	"""
+	save_asset - save an asset in the format given by the file extension.
+	"""
+	if file_name.endswith(CONTAINER_EXTENSION):
+		write_asset(file_name, asset)
+	else:
+		write_dat(file_name, asset)
+
+def find_asset_file(directory, name):
+	"""
+	find_asset_file - the path of an asset file, by its name without the
+	extension (e.g. '0xa.0x1'), or None if there is none. If there is both a
+	JSON and a container file, the most recently written one is used.
+	"""
+	found = None
+	for extension in [DAT_EXTENSION, CONTAINER_EXTENSION]:
+		path = os.path.join(directory, name + extension)
+		if os.path.isfile(path):
+			if (found is None) or (os.path.getmtime(path) > os.path.getmtime(found)):
+				found = path
+	return found
+
+def asset_files(directory):
+	"""
+	asset_files - the names of the asset files in a directory, sorted, one per
+	asset (as for find_asset_file()).
+	"""
+	names = []
+	for file_name in sorted(os.listdir(directory)):
+		name, extension = os.path.splitext(file_name)
+		if extension in [DAT_EXTENSION, CONTAINER_EXTENSION] and name not in names:
+			names.append(name)
+	return [os.path.basename(find_asset_file(directory, name)) for name in names]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import os
+import json
+import hashlib
+
+# The manifest of a directory of asset files is kept in the directory itself
+MANIFEST_NAME = "manifest.json"
+
+def data_hash(data):
+	"""
+	data_hash - the md5 hex digest of some bytes.
+	"""
+	return hashlib.md5(data).hexdigest()
+
+def file_hash(file_name):
+	"""
+	file_hash - the md5 hex digest of the contents of a file, or None if there is no such file.
+	"""
+	if not os.path.isfile(file_name):
+		return None
+	f = open(file_name, "rb")
+	data = f.read()
+	f.close()
+	return data_hash(data)
+
+class Manifest(object):
+	"""
+	What each asset file in a directory was made from.
+
+	Each asset (by name, e.g. '0xa.0x1') has the hashes of the inputs it was
+	made from, the name of the file that was written and the hash of that
+	file. An asset only has to be made again if one of its inputs has
+	changed, or its file is not the one that was written; a file which is
+	there but has changed since (e.g. edited by hand) is not for a tool to
+	overwrite without being told to.
+
+	Snapshots of the translation table codes (see Table.table_codes()) are
+	kept by their hash, for as long as any asset was made with them.
+	"""
+
+	def __init__(self, directory):
+		self.directory = directory
+		self.file_name = os.path.join(directory, MANIFEST_NAME)
+		self.assets = {}
+		self.tables = {}
+		try:
+			f = open(self.file_name, "rb")
+			manifest = json.loads(f.read().decode("utf-8"))
+			f.close()
+			self.assets = manifest.get("assets", {})
+			self.tables = manifest.get("tables", {})
+		except (IOError, OSError, ValueError, AttributeError):
+			pass
+
+	def inputs(self, name):
+		"""
+		The input hashes an asset was last made from, or None if it is not in the manifest.
+		"""
+		entry = self.assets.get(name)
+		if entry is None:
+			return None
+		return entry["inputs"]
+
+	def written(self, name, output_name):
+		"""
+		True if output_name is the file last written for an asset, and it has not changed since.
+		"""
+		entry = self.assets.get(name)
+		if (entry is None) or (entry["output"] != output_name):
+			return False
+		return file_hash(os.path.join(self.directory, output_name)) == entry["output_hash"]
+
+	def unchanged(self, name, inputs, output_name):
+		"""
+		True if an asset was last made from the same inputs, in to the same
+		file, and that file has not changed since.
+		"""
+		return (self.inputs(name) == inputs) and self.written(name, output_name)
+
+	def record(self, name, inputs, output_name):
+		"""
+		Record that an asset has just been written to output_name, from the given inputs.
+		"""
+		self.assets[name] = {
+			"inputs" : inputs,
+			"output" : output_name,
+			"output_hash" : file_hash(os.path.join(self.directory, output_name)),
+		}
+
+	def save(self):
+		"""
+		Write the manifest back to its directory, dropping any table snapshots no asset was made with.
+		"""
+		used = set([entry["inputs"].get("tables") for entry in self.assets.values()])
+		self.tables = dict([(k, v) for k, v in self.tables.items() if k in used])
+		tmp_name = self.file_name + ".tmp"
+		f = open(tmp_name, "wb")
+		f.write(json.dumps({"assets" : self.assets, "tables" : self.tables}, indent = 1, sort_keys = True, separators = (",", ": ")).encode("utf-8"))
+		f.close()
+		if hasattr(os, "replace"):
+			os.replace(tmp_name, self.file_name)
+		else:
+			if os.path.isfile(self.file_name):
+				os.remove(self.file_name)
+			os.rename(tmp_name, self.file_name)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+import re
+import numpy
+
+from config import SWITCH_MODE, KANJI_CODE, DAKUTEN_ALL, PC_NAME, DIALOGUE_BOX
+from Tiles import decode_tiles, TILE_WIDTH, TILE_HEIGHT, TILE_SIZE
+
+# The screen, in tiles
+SCREEN_COLUMNS = 32
+SCREEN_ROWS = 28
+# Each line of text is two tiles high; dakuten and the tops of double
+# height characters go in the upper one
+LINE_ROWS = 2
+# The box used until a string opens one of its own
+DEFAULT_BOX = (24, 3, "bottom_centred")
+# Columns moved on by <newline_tab>
+TAB_COLUMNS = 4
+
+# The 8x8 font holds the tiles of byte codes 0x20-0xFF, in order
+FONT_FIRST_CODE = 0x20
+# The double height font is held from VRAM 0x2000, i.e. from tile 0x200, and
+# double height characters are given by their VRAM tile numbers
+FONT_DOUBLE_FIRST_TILE = 0x200
+FONT_DOUBLE_TILES = 0x200
+
+# Colours: the font's own 16, then the box, and the font again in red for
+# anything drawn outside the box
+BOX_COLOUR = 16
+FRAME_COLOUR = 17
+OVERFLOW_COLOURS = 32
+PALETTE = [(n * 17, n * 17, n * 17) for n in range(0, 16)] + [(0, 0, 96), (224, 224, 224)] + [(0, 0, 0)] * 14 + [(n * 17, 0, 0) for n in range(0, 16)]
+
+# e.g. <newbox_b_24x3@bottom_centred>
+BOX_NAME = re.compile(r"^<newbox_[a-z]_(\d+)x(\d+)@([a-z]+_[a-z]+)")
+
+def load_font(rom, font_address, font_double_address = None):
+	"""
+	load_font - the glyph tiles of the 8x8 font, as an array of (256, 8, 8)
+	colour numbers by byte code (codes below 0x20 are blank), and of the
+	double height font by VRAM tile number from FONT_DOUBLE_FIRST_TILE (or
+	None if it is not given).
+	"""
+	font = numpy.zeros((256, TILE_HEIGHT, TILE_WIDTH), dtype = numpy.uint8)
+	font[FONT_FIRST_CODE:] = decode_tiles(rom.slice(font_address, font_address + ((256 - FONT_FIRST_CODE) * TILE_SIZE)))
+	font_double = None
+	if font_double_address is not None:
+		font_double = decode_tiles(rom.slice(font_double_address, min(len(rom), font_double_address + (FONT_DOUBLE_TILES * TILE_SIZE))))
+	return font, font_double
+
+def table_text(value):
+	"""
+	The text of a translation table value (Python 2 holds them as UTF-8 byte strings).
+	"""
+	if isinstance(value, bytes):
+		return value.decode("utf-8", "replace")
+	return value
+
+class DialogueRenderer(object):
+	"""
+	Draws the bytes of script strings as the game would show them, one
+	picture of the screen for each dialogue box the string opens (or
+	erases and starts again).
+
+	Byte codes 0x20 and up are drawn from the 8x8 font, on the lower half of
+	each line. Control codes are found by their names in the translation
+	table: line breaks, <newline_tab>, <padH>/<padV>, <erasebox>, <closebox>
+	and the dialogue box codes, whose name gives the size and place of the
+	box (e.g. <newbox_b_24x3@bottom_centred> is 24 characters by 3 lines at
+	the bottom of the screen, centred). Player and NPC name codes are drawn
+	as the name in the table. Anything drawn outside the box is shown in red.
+
+	Glyphs are laid out as a grid of tile numbers per box, and the grid is
+	turned in to pixels in one go with NumPy.
+	"""
+
+	def __init__(self, font, font_double, trans_table):
+		# Glyph tiles by atlas number: the 8x8 font by byte code, then the
+		# double height font, then a hatched tile for anything not in it
+		hatched = numpy.zeros((1, TILE_HEIGHT, TILE_WIDTH), dtype = numpy.uint8)
+		hatched[0, ::2, ::2] = 8
+		hatched[0, 1::2, 1::2] = 8
+		if font_double is None:
+			font_double = numpy.zeros((0, TILE_HEIGHT, TILE_WIDTH), dtype = numpy.uint8)
+		self.atlas = numpy.concatenate((font, font_double, hatched))
+		self.double_start = len(font)
+		self.double_count = len(font_double)
+		self.hatched = len(self.atlas) - 1
+
+		# Single byte control codes and the two byte codes, by their names in the table
+		self.controls = {}
+		self.boxes = {}
+		self.names = {}
+		for byte_code in trans_table.keys():
+			name = table_text(trans_table[byte_code]["pre_shift"])
+			try:
+				code = bytearray.fromhex(byte_code)
+			except (TypeError, ValueError):
+				continue
+			if len(code) == 1:
+				self.controls[name] = code[0]
+			elif (len(code) == 2) and (byte_code[:2].upper() == DIALOGUE_BOX):
+				match = BOX_NAME.match(name)
+				if match is not None:
+					self.boxes[code[1]] = (int(match.group(1)), int(match.group(2)), match.group(3))
+			elif (len(code) == 2) and (byte_code[:2].upper() == PC_NAME):
+				if name.startswith("<") and name.endswith(">"):
+					name = name[1:-1]
+				for prefix in ("NPC_", "Player_"):
+					if name.startswith(prefix):
+						name = name[len(prefix):]
+				self.names[code[1]] = name.replace("_", " ").rstrip("?")
+
+		self.newlines = set([self.controls.get(n) for n in ("\\n", "\n", "<addrow>")]) - set([None])
+		self.tab = self.controls.get("<newline_tab>")
+		self.erase = self.controls.get("<erasebox>")
+		self.close = self.controls.get("<closebox>")
+		self.pad_h = self.controls.get("<padH>")
+		self.pad_v = self.controls.get("<padV>")
+		self.slow = self.controls.get("<slow>")
+		self.end = self.controls.get("<end>", 0x00)
+		self.switch_mode = int(SWITCH_MODE, 16)
+		self.kanji_code = int(KANJI_CODE, 16)
+		self.dakuten = set([int(b, 16) for b in DAKUTEN_ALL])
+		self.box_code = int(DIALOGUE_BOX, 16)
+		self.name_code = int(PC_NAME, 16)
+
+	def layout(self, codes):
+		"""
+		The boxes a string is shown in, each as its (width, lines, place) and
+		a dict of (tile row, column) to atlas number of everything drawn in it.
+		"""
+		pages = []
+		box = DEFAULT_BOX
+		cells = {}
+		line = 0
+		column = 0
+		n = len(codes)
+		i = 0
+		while i < n:
+			c = codes[i]
+			if c == self.end:
+				break
+			if (c == self.box_code) and ((i + 1) < n) and (codes[i + 1] in self.boxes):
+				if len(cells) > 0:
+					pages.append((box, cells))
+				box = self.boxes[codes[i + 1]]
+				cells = {}
+				line = 0
+				column = 0
+				i += 2
+				continue
+			if (c == self.name_code) and ((i + 1) < n) and (codes[i + 1] in self.names):
+				for letter in self.names[codes[i + 1]]:
+					cells[(line * LINE_ROWS + 1, column)] = ord(letter) & 0xFF
+					column += 1
+				i += 2
+				continue
+			if (c == self.kanji_code) and ((i + 1) < n):
+				# The next byte is how many bytes of VRAM tile numbers follow,
+				# two per tile, top and then bottom of each column
+				count = codes[i + 1]
+				run = codes[i + 2:i + 2 + count]
+				for j in range(0, len(run) - 3, 4):
+					cells[(line * LINE_ROWS, column)] = self.double_tile((run[j] << 8) | run[j + 1])
+					cells[(line * LINE_ROWS + 1, column)] = self.double_tile((run[j + 2] << 8) | run[j + 3])
+					column += 1
+				i += 2 + count
+				continue
+			if c in self.newlines:
+				line += 1
+				column = 0
+			elif c == self.tab:
+				line += 1
+				column = TAB_COLUMNS
+			elif (c == self.erase) or (c == self.close):
+				if len(cells) > 0:
+					pages.append((box, cells))
+				if c == self.close:
+					box = DEFAULT_BOX
+				cells = {}
+				line = 0
+				column = 0
+			elif (c == self.pad_h) and ((i + 1) < n):
+				column += codes[i + 1]
+				i += 1
+			elif (c == self.pad_v) and ((i + 1) < n):
+				line += codes[i + 1]
+				i += 1
+			elif (c == self.slow) and ((i + 1) < n):
+				i += 1
+			elif c in self.dakuten:
+				# Over the top of the character before
+				cells[(line * LINE_ROWS, max(0, column - 1))] = c
+			elif (c >= FONT_FIRST_CODE) and (c != self.switch_mode):
+				cells[(line * LINE_ROWS + 1, column)] = c
+				column += 1
+			i += 1
+		if (len(cells) > 0) or (len(pages) == 0):
+			pages.append((box, cells))
+		return pages
+
+	def double_tile(self, tile):
+		"""
+		The atlas number of a double height font tile, by its VRAM tile number.
+		"""
+		index = tile - FONT_DOUBLE_FIRST_TILE
+		if (index < 0) or (index >= self.double_count):
+			return self.hatched
+		return self.double_start + index
+
+	def render_page(self, box, cells):
+		"""
+		A picture of the screen with one box, as an array of rows of colours.
+		Returns it with the number of characters drawn outside the box.
+		"""
+		(width, lines, place) = box
+		rows = lines * LINE_ROWS
+		(vertical, horizontal) = place.split("_")
+		# The box and its frame, in tiles
+		box_top = {"top" : 1, "middle" : (SCREEN_ROWS - rows - 2) // 2}.get(vertical, SCREEN_ROWS - rows - 3)
+		box_left = {"left" : 1, "right" : SCREEN_COLUMNS - width - 3}.get(horizontal, (SCREEN_COLUMNS - width - 2) // 2)
+
+		screen = numpy.zeros((SCREEN_ROWS * TILE_HEIGHT, SCREEN_COLUMNS * TILE_WIDTH), dtype = numpy.uint8)
+		top = box_top * TILE_HEIGHT
+		left = box_left * TILE_WIDTH
+		bottom = top + ((rows + 2) * TILE_HEIGHT)
+		right = left + ((width + 2) * TILE_WIDTH)
+		screen[top:bottom, left:right] = FRAME_COLOUR
+		screen[top + 2:bottom - 2, left + 2:right - 2] = BOX_COLOUR
+
+		# Every tile of the text, inside the box or not, as far as the screen goes
+		grid = numpy.zeros((SCREEN_ROWS - box_top - 1, SCREEN_COLUMNS - box_left - 1), dtype = numpy.intp)
+		outside = numpy.zeros(grid.shape, dtype = bool)
+		overflow = 0
+		for (row, column), tile in cells.items():
+			if (row >= rows) or (column >= width):
+				if (row % LINE_ROWS) == (LINE_ROWS - 1):
+					overflow += 1
+				if (row >= grid.shape[0]) or (column >= grid.shape[1]):
+					continue
+				outside[row, column] = True
+			grid[row, column] = tile
+		(grid_rows, grid_columns) = grid.shape
+		pixels = self.atlas[grid].transpose(0, 2, 1, 3).reshape(grid_rows * TILE_HEIGHT, grid_columns * TILE_WIDTH)
+		outside = numpy.repeat(numpy.repeat(outside, TILE_HEIGHT, axis = 0), TILE_WIDTH, axis = 1)
+
+		text_top = top + TILE_HEIGHT
+		text_left = left + TILE_WIDTH
+		area = screen[text_top:text_top + pixels.shape[0], text_left:text_left + pixels.shape[1]]
+		inked = pixels > 0
+		area[inked & ~outside] = pixels[inked & ~outside]
+		area[inked & outside] = pixels[inked & outside] + OVERFLOW_COLOURS
+		return screen, overflow
+
+	def render(self, codes):
+		"""
+		A picture of every box a string is shown in, side by side, as an
+		array of rows of colours. Returns it with the number of characters
+		drawn outside their box.
+		"""
+		screens = []
+		overflow = 0
+		for box, cells in self.layout(codes):
+			screen, page_overflow = self.render_page(box, cells)
+			if len(screens) > 0:
+				screens.append(numpy.zeros((screen.shape[0], TILE_WIDTH), dtype = numpy.uint8))
+			screens.append(screen)
+			overflow += page_overflow
+		return numpy.concatenate(screens, axis = 1), overflow
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+import mmap
+from config import BANK_SIZE, ASSET_WINDOW, ASSET_WINDOW_SIZE
+
+class Rom(object):
+	"""
+	A ROM file, mapped in to memory.
+
+	Banks and assets are handed out as memoryview slices of the mapped file,
+	so nothing is copied until it is used. Python 2 can not make a memoryview
+	of an mmap, so there the slices are plain byte strings instead.
+	"""
+
+	def __init__(self, file_name, writable = False):
+		self.file_name = file_name
+		if writable:
+			self.file = open(file_name, "r+b")
+			self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_WRITE)
+		else:
+			self.file = open(file_name, "rb")
+			self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+		try:
+			self.data = memoryview(self.map)
+		except TypeError:
+			self.data = self.map
+
+	def __len__(self):
+		return len(self.map)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""
+		Unmap and close the ROM file. Any slices still in use must be released first.
+		"""
+		if isinstance(self.data, memoryview):
+			self.data.release()
+		self.map.close()
+		self.file.close()
+
+	def banks(self):
+		"""
+		The number of whole banks in the ROM file.
+		"""
+		return len(self.map) // BANK_SIZE
+
+	def slice(self, start, end):
+		"""
+		The bytes of the ROM file from start up to (not including) end.
+		"""
+		if start < 0 or end > len(self.map) or start > end:
+			raise IndexError("%s-%s is outside the ROM (%s bytes)" % (hex(start), hex(end), len(self.map)))
+		return self.data[start:end]
+
+	def bank(self, bank, count = 1):
+		"""
+		The bytes of a bank, or of count banks starting from it.
+		"""
+		return self.slice(bank * BANK_SIZE, (bank + count) * BANK_SIZE)
+
+	def asset(self, bank, asset_index):
+		"""
+		The bytes of an asset, from its start address up to its limit in the asset catalog.
+		"""
+		from AssetCatalog import get_catalog
+		asset = get_catalog().get(bank, asset_index)
+		if asset is None:
+			raise KeyError("No asset %s.%s" % (hex(bank), hex(asset_index)))
+		return self.slice(asset["asset_rom_pointer_address"], asset["asset_rom_pointer_address_limit"])
+
+	def pce(self, bank, address, size):
+		"""
+		The bytes at a PCE memory address, with the given bank mapped in to the asset window.
+		"""
+		start = pce_to_offset(bank, address)
+		return self.slice(start, start + size)
+
+	def md5(self):
+		"""
+		The md5 hex digest of the whole ROM file.
+		"""
+		import hashlib
+		return hashlib.md5(self.data).hexdigest()
+
+def pce_to_offset(bank, address, window = ASSET_WINDOW, window_size = ASSET_WINDOW_SIZE):
+	"""
+	pce_to_offset - the file offset of a PCE memory address, with the given
+	bank mapped in at the start of the window.
+	"""
+	if address < window or address >= window + window_size:
+		raise ValueError("%s is outside the window %s-%s" % (hex(address), hex(window), hex(window + window_size - 1)))
+	return (bank * BANK_SIZE) + (address - window)
+
+def offset_to_pce(offset, window = ASSET_WINDOW):
+	"""
+	offset_to_pce - the bank and PCE memory address of a file offset, with the
+	bank mapped in at the start of the window.
+	"""
+	return (offset // BANK_SIZE), window + (offset % BANK_SIZE)
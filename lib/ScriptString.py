@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+from translators import hex_to_codes, codes_to_hex
+from AssetContainer import as_text, COLUMN_BITS
+
+class ScriptString(object):
+	"""
+	One string of a script asset, as the tools work on it.
+
+	There are thousands of strings in the script, so rather than a dict
+	each is held in __slots__, with its bytes as a single bytes object,
+	start_pos as a number and each text column as a single unicode string
+	(the text as it reads back from an asset file). from_asset() and
+	asset_string() convert from and to the strings of an asset file.
+
+	Any other fields a string has in its asset file are kept in extra (None
+	if there are none), but are not written back out.
+	"""
+
+	__slots__ = ["string_number", "start_pos", "bytes", "PCE_japanese", "SNES_japanese", "SNES_english", "SNES_accuracy", "PCE_english", "notes", "extra"]
+
+	def __init__(self, string_number, start_pos, string_bytes, PCE_japanese = u""):
+		self.string_number = string_number
+		self.start_pos = start_pos
+		self.bytes = string_bytes
+		self.PCE_japanese = PCE_japanese
+		self.SNES_japanese = u""
+		self.SNES_english = u""
+		self.SNES_accuracy = 0.0
+		self.PCE_english = u""
+		self.notes = u""
+		self.extra = None
+
+	@classmethod
+	def from_asset(cls, string):
+		"""
+		A string of an asset, as loaded from its file ("bytes" may be a list
+		of hex strings or a bytearray). Raises ValueError if the bytes are not
+		all single hex bytes.
+		"""
+		codes = hex_to_codes(string["bytes"])
+		if codes is None:
+			raise ValueError("String %s does not hold single hex bytes" % string.get("string_number"))
+		script_string = cls(string["string_number"], int(string["start_pos"], 16), bytes(codes), as_text(string.get("PCE_japanese", u"")))
+		script_string.SNES_japanese = as_text(string.get("SNES_japanese", u""))
+		script_string.SNES_english = as_text(string.get("SNES_english", u""))
+		script_string.SNES_accuracy = string.get("SNES_accuracy", 0.0)
+		script_string.PCE_english = as_text(string.get("PCE_english", u""))
+		script_string.notes = as_text(string.get("notes", u""))
+		for k in string.keys():
+			if k not in COLUMN_BITS:
+				if script_string.extra is None:
+					script_string.extra = {}
+				script_string.extra[k] = string[k]
+		return script_string
+
+	def has_extra(self, key):
+		"""
+		True if the asset file had a field of this name for the string, other than the usual ones.
+		"""
+		return (self.extra is not None) and (key in self.extra)
+
+	def asset_string(self):
+		"""
+		The string as it reads back from an asset file.
+		"""
+		return {
+			"string_number" : self.string_number,
+			"string_size" : len(self.bytes),
+			"start_pos" : u"%s" % hex(self.start_pos),
+			"bytes" : codes_to_hex(self.bytes),
+			"PCE_japanese" : as_text(self.PCE_japanese),
+			"SNES_japanese" : as_text(self.SNES_japanese),
+			"SNES_english" : as_text(self.SNES_english),
+			# The same precision as the JSON file
+			"SNES_accuracy" : float("%s" % self.SNES_accuracy),
+			"PCE_english" : as_text(self.PCE_english),
+			"notes" : as_text(self.notes),
+		}
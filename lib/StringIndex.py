@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+import os
+import re
+import json
+import struct
+
+from AssetContainer import read_asset, write_asset, dat_string, as_text, CONTAINER_EXTENSION
+
+#########################################################################
+# String index
+# ------------
+# A JSON asset file (.dat) has its index in a file next to it, with the
+# same name and INDEX_EXTENSION added, giving where each string is in the
+# file so that it can be read or written without the rest of the file.
+# All numbers are little endian. The file is an INDEX_HEADER, followed by
+# one INDEX_ROW per string, in the order they are in the asset file.
+#
+# An index is only used while the asset file has the size and modification
+# time it was built from, and is built again otherwise. Binary containers
+# (.cka) are compressed as a whole, so have no index and are read in full.
+#########################################################################
+
+INDEX_EXTENSION = ".index"
+INDEX_MAGIC = b"CKI\x01"
+
+# magic, number of strings, then the size and modification time of the asset file
+INDEX_HEADER = struct.Struct("<4sIQd")
+
+# string_number, offset and length of the string in the asset file (from its
+# opening brace to its closing one), start_pos, number of bytes in the ROM and
+# status flags
+INDEX_ROW = struct.Struct("<IIIIII")
+
+# Status flags of a string
+STATUS_END = 0x01
+STATUS_SNES = 0x02
+STATUS_TRANSLATED = 0x04
+STATUS_NOTES = 0x08
+STATUS_NAMES = [(STATUS_END, "end"), (STATUS_SNES, "snes"), (STATUS_TRANSLATED, "translated"), (STATUS_NOTES, "notes")]
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+def string_status(string):
+	"""
+	string_status - the status flags of a string, as loaded from an asset file.
+	"""
+	status = 0
+	codes = string.get("bytes", [])
+	if (len(codes) == 1) and (codes[0] in [u"00", 0]):
+		status |= STATUS_END
+	for column, flag in [("SNES_english", STATUS_SNES), ("PCE_english", STATUS_TRANSLATED), ("notes", STATUS_NOTES)]:
+		if len(string.get(column, u"")) > 0:
+			status |= flag
+	return status
+
+def string_row(string, offset, length):
+	"""
+	string_row - the index row of a string, found at offset in its asset file.
+	"""
+	return (string["string_number"], offset, length, int(as_text(string.get("start_pos", u"0x0")), 16), len(string.get("bytes", [])), string_status(string))
+
+def expect(text, pos, character):
+	"""
+	The position after a character of JSON text, skipping any white space before it.
+	"""
+	pos = WHITESPACE.match(text, pos).end()
+	if text[pos:pos + 1] != character:
+		raise ValueError("Expected '%s' at character %s" % (character, pos))
+	return pos + 1
+
+def scan_strings(data):
+	"""
+	scan_strings - the strings of a JSON asset file (as UTF-8 bytes), each
+	with the offset and length in bytes of its text in the file.
+	"""
+	text = data.decode("utf-8")
+	decoder = json.JSONDecoder()
+	found = []
+	byte_pos = 0
+	char_pos = 0
+	pos = expect(text, 0, u"{")
+	# The asset level fields are skipped over one at a time, up to the strings
+	while True:
+		pos = WHITESPACE.match(text, pos).end()
+		if text[pos:pos + 1] == u"}":
+			break
+		key, pos = decoder.raw_decode(text, pos)
+		pos = WHITESPACE.match(text, expect(text, pos, u":")).end()
+		if key != u"strings":
+			value, pos = decoder.raw_decode(text, pos)
+		else:
+			pos = WHITESPACE.match(text, expect(text, pos, u"[")).end()
+			while text[pos:pos + 1] != u"]":
+				string, end = decoder.raw_decode(text, pos)
+				byte_pos += len(text[char_pos:pos].encode("utf-8"))
+				char_pos = pos
+				found.append((string, byte_pos, len(text[pos:end].encode("utf-8"))))
+				pos = WHITESPACE.match(text, end).end()
+				if text[pos:pos + 1] == u",":
+					pos = WHITESPACE.match(text, pos + 1).end()
+			pos += 1
+		pos = WHITESPACE.match(text, pos).end()
+		if text[pos:pos + 1] == u",":
+			pos += 1
+	return found
+
+def write_index(file_name, rows):
+	"""
+	write_index - save the index rows of a JSON asset file next to it.
+	"""
+	st = os.stat(file_name)
+	f = open(file_name + INDEX_EXTENSION, "wb")
+	f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(rows), st.st_size, st.st_mtime))
+	f.write(b"".join([INDEX_ROW.pack(*row) for row in rows]))
+	f.close()
+
+def build_index(file_name):
+	"""
+	build_index - index a JSON asset file, saving the index next to it, and return the rows.
+	"""
+	f = open(file_name, "rb")
+	data = f.read()
+	f.close()
+	rows = [string_row(string, offset, length) for string, offset, length in scan_strings(data)]
+	write_index(file_name, rows)
+	return rows
+
+def read_index(file_name):
+	"""
+	read_index - the index rows of a JSON asset file from its index file, or
+	None if there is none or it is not for the file as it is now.
+	"""
+	try:
+		f = open(file_name + INDEX_EXTENSION, "rb")
+		data = f.read()
+		f.close()
+		(magic, count, size, mtime) = INDEX_HEADER.unpack_from(data, 0)
+	except (IOError, OSError, struct.error):
+		return None
+	st = os.stat(file_name)
+	if (magic != INDEX_MAGIC) or (size != st.st_size) or (mtime != st.st_mtime) or (len(data) != INDEX_HEADER.size + (count * INDEX_ROW.size)):
+		return None
+	return [INDEX_ROW.unpack_from(data, INDEX_HEADER.size + (i * INDEX_ROW.size)) for i in range(0, count)]
+
+def asset_index(file_name):
+	"""
+	asset_index - the index rows of an asset file (see INDEX_ROW), building
+	the index if need be. Rows of a binary container have no offset or length.
+	"""
+	if file_name.endswith(CONTAINER_EXTENSION):
+		return [string_row(string, 0, 0) for string in read_asset(file_name, raw_bytes = True)["strings"]]
+	rows = read_index(file_name)
+	if rows is None:
+		rows = build_index(file_name)
+	return rows
+
+def find_string(file_name, rows, string_number):
+	"""
+	The position in the rows of a string of a JSON asset file, and the string
+	as read from the file. The string is None if it is not where the rows
+	give it, and both are None if the rows have no such string.
+	"""
+	for i, row in enumerate(rows):
+		if row[0] != string_number:
+			continue
+		f = open(file_name, "rb")
+		f.seek(row[1])
+		data = f.read(row[2])
+		f.close()
+		try:
+			string = json.loads(data.decode("utf-8"))
+		except (ValueError, UnicodeDecodeError):
+			return i, None
+		if (type(string) is not dict) or (string.get("string_number") != string_number):
+			return i, None
+		return i, string
+	return None, None
+
+def read_string(file_name, string_number):
+	"""
+	read_string - one string of an asset file, by its string_number, the same
+	as in the strings of the whole file when loaded, or None if there is no
+	such string.
+	"""
+	if file_name.endswith(CONTAINER_EXTENSION):
+		for string in read_asset(file_name)["strings"]:
+			if string.get("string_number") == string_number:
+				return string
+		return None
+	i, string = find_string(file_name, asset_index(file_name), string_number)
+	if (i is not None) and (string is None):
+		# The file may have been changed without its size or time changing
+		i, string = find_string(file_name, build_index(file_name), string_number)
+	return string
+
+def update_string(file_name, string):
+	"""
+	update_string - write one string back to an asset file, in place of the
+	string with the same string_number. Returns False if there is no such
+	string, and raises ValueError if the string would not read back from a
+	JSON asset file.
+	"""
+	string_number = string["string_number"]
+	if file_name.endswith(CONTAINER_EXTENSION):
+		asset = read_asset(file_name)
+		for i, old_string in enumerate(asset["strings"]):
+			if old_string.get("string_number") == string_number:
+				asset["strings"][i] = string
+				write_asset(file_name, asset)
+				return True
+		return False
+
+	block = dat_string(string).encode("utf-8")
+	# Text which would not read back (e.g. an unescaped quote) would break the whole file
+	json.loads(block.decode("utf-8"))
+	rows = asset_index(file_name)
+	i, old_string = find_string(file_name, rows, string_number)
+	if (i is not None) and (old_string is None):
+		# The file may have been changed without its size or time changing
+		rows = build_index(file_name)
+		i, old_string = find_string(file_name, rows, string_number)
+	if old_string is None:
+		return False
+	offset = rows[i][1]
+	length = rows[i][2]
+	f = open(file_name, "r+b")
+	if len(block) == length:
+		f.seek(offset)
+		f.write(block)
+	else:
+		# Everything after the string moves up or down
+		f.seek(offset + length)
+		tail = f.read()
+		f.seek(offset)
+		f.write(block)
+		f.write(tail)
+		f.truncate()
+	f.close()
+	shift = len(block) - length
+	rows = list(rows)
+	rows[i] = string_row(string, offset, len(block))
+	for j in range(i + 1, len(rows)):
+		rows[j] = (rows[j][0], rows[j][1] + shift) + tuple(rows[j][2:])
+	write_index(file_name, rows)
+	return True
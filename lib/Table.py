@@ -1,19 +1,120 @@
 #!/usr/bin/env python
 
-import traceback
 import sys
+import os
 import re
-from config import TABLE_NAME, TABLE_NAME_DOUBLE
+from array import array
+from config import TABLE_NAME, TABLE_NAME_DOUBLE, TABLE_CACHE_NAME
 
-def load_snes_table(snes_name):
+# Change this whenever the layout of the table cache, or what is compiled in to it, changes
+TABLE_CACHE_VERSION = 1
+
+# The table cache as last read or built by this process
+TABLE_CACHE = None
+
+# The tables shared by everything in this process, by name, once they are loaded
+TABLE_REGISTRY = {}
+
+class TranslationTable(dict):
+	"""
+	A translation table as loaded from its CSV file.
+	
+	source_hash is the hash of the CSV files it came from, so that anything
+	compiled from the table can be found again in the table cache. Tables are
+	treated as read only once loaded.
+	"""
+	source_hash = None
+
+class SNESScript(object):
+	"""
+	The SNES script, indexed for matching against the PCE script.
+	
+	Each line of the script is kept at the same position in a set of parallel
+	lists: the Japanese text (with {..} control codes removed), the English
+	text, the squashed Japanese text (see squash_snes_text()), the md5 of the
+	squashed text and its length. Lines can be looked up directly by their
+	Japanese or squashed Japanese text.
+	
+	As with the old dictionary of the script, when the same Japanese text is
+	found more than once, the English of the last one is kept.
 	"""
-	load_snes_table - load the existing SNES script
+	
+	def __init__(self):
+		self.japanese = []
+		self.english = []
+		self.squashed = []
+		self.squashed_hash = []
+		self.length = array('I')
+		# Line numbers by Japanese text, and lists of line numbers by squashed text
+		self.by_japanese = {}
+		self.by_squashed = {}
+	
+	def __len__(self):
+		return len(self.japanese)
+	
+	def add(self, japanese, english):
+		"""
+		Add a line of the script, or replace the English of an existing line.
+		"""
+		if japanese in self.by_japanese:
+			self.english[self.by_japanese[japanese]] = english
+			return
+		import hashlib
+		i = len(self.japanese)
+		squashed = squash_snes_text(japanese)
+		self.japanese.append(japanese)
+		self.english.append(english)
+		self.squashed.append(squashed)
+		self.squashed_hash.append(hashlib.md5(squashed.encode('utf-8')).hexdigest())
+		self.length.append(len(squashed))
+		self.by_japanese[japanese] = i
+		self.by_squashed.setdefault(squashed, []).append(i)
+	
+	def find(self, japanese):
+		"""
+		Return the line number of some Japanese text, or None if it is not in the script.
+		"""
+		return self.by_japanese.get(japanese)
+	
+	def find_squashed(self, squashed):
+		"""
+		Return the line numbers whose Japanese text squashes to the given text.
+		"""
+		return self.by_squashed.get(squashed, [])
+
+def squash_snes_text(japanese):
+	"""
+	squash_snes_text - squash a line of Japanese SNES text in to the form used to
+	match it against the PCE script, by removing control codes, newlines and
+	spaces, and anything before the opening Japanese quotation mark.
+	"""
+	text = japanese
+	if isinstance(text, bytes):
+		try:
+			text = text.decode('utf-8')
+		except UnicodeDecodeError:
+			text = text.decode('shift-jis', 'replace')
+	text = re.sub(u'{..}', u'', text)
+	text = text.replace(u'\n', u'')
+	# Left over from decoding the original byte strings - this is the digit 2
+	text = text.replace(u'\x32', u'')
+	text = text.replace(u' ', u'')
+	# Text after the first Japanese quotation marks (u300c and u300e)
+	for quote in [u'\u300c', u'\u300e']:
+		if quote in text:
+			text = text.split(quote)[1]
+	# Long vowel marks become dashes
+	text = text.replace(u'\u30fc', u'-')
+	return text
+
+def parse_snes_table(snes_name):
+	"""
+	parse_snes_table - parse the SNES script, in to a SNESScript.
 	The SNES script is a simple, two-column CSV file;
 	col 1 = Japanese text
 	col 2 = English text
 	"""
-
-	trans_table = {}
+	snes_script = SNESScript()
 	try:
 		line = ""
 		f = open(snes_name, "r")
@@ -26,18 +127,233 @@ def load_snes_table(snes_name):
 					value += i		
 			else:
 				value = columns[1].rstrip('\r\n')
-			trans_table[key] = re.sub('{..}','' , value)
-		f.close
+			snes_script.add(key, re.sub('{..}','' , value))
+		f.close()
 	except Exception as e:
+		import traceback
 		print(traceback.format_exc())
 		print(e)
 		print(line)
 		sys.exit(2)
-	return trans_table
+	return snes_script
+
+def load_snes_index(snes_name):
+	"""
+	load_snes_index - load the SNES script as a SNESScript.
+	
+	The index is kept in a file next to the script, which is read with a single
+	read, and built again whenever the script changes.
+	"""
+	source_hash = files_hash([snes_name])
+	index_name = snes_name + ".py%s.index" % sys.version_info[0]
+	cache = read_cache(index_name, source_hash)
+	if cache is None:
+		cache = {
+			"hash" : source_hash,
+			"script" : parse_snes_table(snes_name),
+		}
+		write_cache(index_name, cache)
+	return cache["script"]
+
+def load_snes_table(snes_name):
+	"""
+	load_snes_table - load the SNES script as a dictionary of Japanese text to English text.
+	"""
+	snes_script = load_snes_index(snes_name)
+	return dict(zip(snes_script.japanese, snes_script.english))
+
+def files_hash(file_names):
+	"""
+	files_hash - the hash of the contents of a list of files, for the cache files built from them.
+	"""
+	import hashlib
+	h = hashlib.md5()
+	h.update(("%s/%s/" % (TABLE_CACHE_VERSION, sys.version_info[0])).encode('ascii'))
+	for file_name in file_names:
+		f = open(file_name, "rb")
+		h.update(f.read())
+		f.close()
+	return h.hexdigest()
+
+def table_hash():
+	"""
+	table_hash - the hash of the contents of both translation table CSV files.
+	"""
+	return files_hash([TABLE_NAME, TABLE_NAME_DOUBLE])
+
+def table_codes(trans_table, trans_table_double):
+	"""
+	table_codes - a digest of each entry of both translation tables, by the
+	code it translates (prefixed with S for the main table and D for the
+	double height table), so that two versions of the tables can be
+	compared code by code.
+	"""
+	import hashlib
+	codes = {}
+	for prefix, table in [("S", trans_table), ("D", trans_table_double)]:
+		for byte_code in table.keys():
+			entry = table[byte_code]
+			text = "\t".join(["%s=%s" % (k, entry[k]) for k in sorted(entry.keys())])
+			if not isinstance(text, bytes):
+				text = text.encode("utf-8")
+			codes[prefix + byte_code.upper()] = hashlib.md5(text).hexdigest()
+	return codes
+
+def codes_hash(codes):
+	"""
+	codes_hash - the hash of a set of table_codes(), which is the same under
+	Python 2 and 3 (unlike table_hash()).
+	"""
+	import hashlib
+	h = hashlib.md5()
+	for code in sorted(codes.keys()):
+		h.update(("%s=%s\n" % (code, codes[code])).encode("ascii"))
+	return h.hexdigest()
+
+def changed_codes(old_codes, new_codes):
+	"""
+	changed_codes - the bytes of every code that was added, removed or
+	changed between two sets of table_codes(), or None if one of them is
+	not a hex code. Only strings containing one of them can translate any
+	differently.
+	"""
+	changed = []
+	for code in sorted(set(old_codes.keys()) | set(new_codes.keys())):
+		if old_codes.get(code) != new_codes.get(code):
+			try:
+				changed.append(bytes(bytearray.fromhex(code[1:])))
+			except ValueError:
+				return None
+	return changed
+
+def read_cache(cache_name, source_hash):
+	"""
+	read_cache - load a cache file, such as the compiled translation tables,
+	or None if there is no cache file or it was built from different files.
+	"""
+	import pickle
+	try:
+		f = open(cache_name, "rb")
+		data = f.read()
+		f.close()
+		cache = pickle.loads(data)
+	except Exception:
+		return None
+	if (not isinstance(cache, dict)) or (cache.get("hash") != source_hash):
+		return None
+	return cache
+
+def write_cache(cache_name, cache):
+	"""
+	write_cache - save a cache file, such as the compiled translation tables.
+	The cache is only there to save time, so failing to write it is not an error.
+	"""
+	import pickle
+	tmp_name = cache_name + ".tmp"
+	try:
+		f = open(tmp_name, "wb")
+		f.write(pickle.dumps(cache, pickle.HIGHEST_PROTOCOL))
+		f.close()
+		if hasattr(os, "replace"):
+			os.replace(tmp_name, cache_name)
+		else:
+			if os.path.isfile(cache_name):
+				os.remove(cache_name)
+			os.rename(tmp_name, cache_name)
+	except Exception:
+		pass
+
+def load_table_cache():
+	"""
+	load_table_cache - return the translation table cache, building it from
+	the CSV files first if they have changed since it was written.
+	
+	The cache holds the forward tables as loaded by load_table() and
+	load_table_double(), along with anything that has been compiled from them
+	(see compiled_table()). The cache file is only read once by each process,
+	unless the CSV files change.
+	"""
+	global TABLE_CACHE
+	source_hash = table_hash()
+	if (TABLE_CACHE is not None) and (TABLE_CACHE["hash"] == source_hash):
+		return TABLE_CACHE
+	cache = read_cache(TABLE_CACHE_NAME, source_hash)
+	if cache is None:
+		cache = {
+			"hash" : source_hash,
+			"table" : parse_table(),
+			"table_double" : parse_table_double(),
+			"compiled" : {},
+		}
+		cache["table"].source_hash = source_hash
+		cache["table_double"].source_hash = source_hash
+		write_cache(TABLE_CACHE_NAME, cache)
+	TABLE_CACHE = cache
+	return cache
+
+def compiled_table(name, trans_table, compile_function):
+	"""
+	compiled_table - return something compiled from a translation table, such as a
+	reverse index, from the table cache.
+	
+	If it is not in the cache yet (or the table did not come from load_table()
+	or load_table_double()), compile_function() is called to build it, and the
+	result is saved in the cache for next time.
+	"""
+	source_hash = getattr(trans_table, "source_hash", None)
+	cache = TABLE_CACHE
+	if (source_hash is None) or (cache is None) or (cache["hash"] != source_hash):
+		return compile_function()
+	if name not in cache["compiled"]:
+		cache["compiled"][name] = compile_function()
+		write_cache(TABLE_CACHE_NAME, cache)
+	return cache["compiled"][name]
+
+def get_table():
+	"""
+	get_table - the translation table shared by the whole process.
+	
+	It is loaded the first time anything asks for it, and the same table is
+	returned from then on, so it must not be changed by the caller.
+	"""
+	if "table" not in TABLE_REGISTRY:
+		register_tables()
+	return TABLE_REGISTRY["table"]
+
+def get_table_double():
+	"""
+	get_table_double - the double height (aka Kanji) translation table shared by the whole process.
+	
+	As get_table(), it is loaded on first use and must not be changed by the caller.
+	"""
+	if "table_double" not in TABLE_REGISTRY:
+		register_tables()
+	return TABLE_REGISTRY["table_double"]
+
+def register_tables():
+	"""
+	register_tables - (re)load both translation tables in to the process wide registry.
+	"""
+	cache = load_table_cache()
+	TABLE_REGISTRY["table"] = cache["table"]
+	TABLE_REGISTRY["table_double"] = cache["table_double"]
 
 def load_table():
 	"""
-	load_table - load the translation table.
+	load_table - load the translation table, from the table cache if the CSV file has not changed.
+	"""
+	return load_table_cache()["table"]
+
+def load_table_double():
+	"""
+	load_table_double - load the double height (aka Kanji) translation table, from the
+	table cache if the CSV file has not changed.
+	"""
+	return load_table_cache()["table_double"]
+
+def parse_table():
+	"""
+	parse_table - parse the translation table CSV file.
 	The translation table is a tab delimited data file
 	with the following columns:
 	hex code, actual char pre-0x5c byte, char set type (A/K/H/S), post-0x5c byte, char set type, notes
@@ -46,7 +362,7 @@ def load_table():
 	pre-0x5c = the character shown if the byte come before a 0x5c control byte
 	post-0x5c = the character shown if the byte comes after a 0x5c control byte
 	"""
-	trans_table = {}
+	trans_table = TranslationTable()
 	
 	try:
 		line = ""
@@ -66,22 +382,23 @@ def load_table():
 
 		f.close()
 	except Exception as e:
+		import traceback
 		print(traceback.format_exc())
 		print(e)
 		print(line)
 		sys.exit(2)
 	return trans_table
 
-def load_table_double():
+def parse_table_double():
 	"""
-	load_double_table - load the double height (aka Kanji) translation table.
+	parse_table_double - parse the double height (aka Kanji) translation table CSV file.
 	The translation table is a tab delimited data file
 	with the following columns:
 	hex code, actual char char set type (A/K/H/S), notes
 	
 	where A/S/H/K/Kj = ASCII, Symbol, Hiragana, Katakana, Kanji
 	"""
-	trans_table = {}
+	trans_table = TranslationTable()
 	
 	try:
 		line = ""
@@ -101,6 +418,7 @@ def load_table_double():
 
 		f.close()
 	except Exception as e:
+		import traceback
 		print(traceback.format_exc())
 		print(e)
 		print(line)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import zlib
+import struct
+import numpy
+
+# A PC-Engine background tile is 8x8 pixels of 4 bit planes, 32 bytes. The
+# first 16 bytes hold planes 0 and 1 of each row (interleaved), the next 16
+# hold planes 2 and 3. The top bit of each plane byte is the leftmost pixel.
+TILE_WIDTH = 8
+TILE_HEIGHT = 8
+TILE_SIZE = 32
+# Tiles across a sheet
+SHEET_COLUMNS = 16
+# Without the game palettes, colour n is shown as a level of grey
+GREY_PALETTE = [(n * 17, n * 17, n * 17) for n in range(0, 16)]
+
+# The value of each plane in a pixel
+PLANE_VALUES = numpy.array([1, 2, 4, 8], dtype = numpy.uint8).reshape(1, 1, 4, 1)
+
+def decode_tiles(data):
+	"""
+	decode_tiles - the pixels of every whole tile in some bytes of planar
+	tile data, as an array of (tiles, 8, 8) colour numbers (0-15). Any bytes
+	after the last whole tile are ignored.
+	"""
+	count = len(data) // TILE_SIZE
+	planar = numpy.frombuffer(bytes(bytearray(data[:count * TILE_SIZE])), dtype = numpy.uint8)
+	# (tile, plane pair, row, plane of the pair) -> (tile, row, plane)
+	planes = planar.reshape(count, 2, TILE_HEIGHT, 2).transpose(0, 2, 1, 3).reshape(count, TILE_HEIGHT, 4)
+	# One bit per pixel, leftmost first -> (tile, row, plane, pixel)
+	bits = numpy.unpackbits(planes[..., numpy.newaxis], axis = 3)
+	return (bits * PLANE_VALUES).sum(axis = 2, dtype = numpy.uint8)
+
+def tile_sheet(tiles, columns = SHEET_COLUMNS):
+	"""
+	tile_sheet - a grid of tiles, as an array of rows of colour numbers,
+	filled left to right and then top to bottom. Any space after the last
+	tile is colour 0.
+	"""
+	count = len(tiles)
+	rows = max(1, (count + columns - 1) // columns)
+	padded = numpy.zeros((rows * columns, TILE_HEIGHT, TILE_WIDTH), dtype = numpy.uint8)
+	padded[:count] = tiles
+	return padded.reshape(rows, columns, TILE_HEIGHT, TILE_WIDTH).transpose(0, 2, 1, 3).reshape(rows * TILE_HEIGHT, columns * TILE_WIDTH)
+
+def png_chunk(chunk_type, data):
+	"""
+	png_chunk - a PNG chunk, with its length and CRC.
+	"""
+	return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+def write_png(file_name, pixels, palette = GREY_PALETTE):
+	"""
+	write_png - write an array of rows of colour numbers as a paletted PNG file.
+	"""
+	(height, width) = pixels.shape
+	# Each row starts with its filter type, which is 0 (none)
+	rows = numpy.zeros((height, width + 1), dtype = numpy.uint8)
+	rows[:, 1:] = pixels
+	header = struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)
+	plte = bytes(bytearray([c for rgb in palette for c in rgb]))
+	file_out = open(file_name, "wb")
+	file_out.write(b"\x89PNG\r\n\x1a\n")
+	file_out.write(png_chunk(b"IHDR", header))
+	file_out.write(png_chunk(b"PLTE", plte))
+	file_out.write(png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+	file_out.write(png_chunk(b"IEND", b""))
+	file_out.close()
+
+def write_raw_tiles(file_name, tiles):
+	"""
+	write_raw_tiles - write the colour numbers of some tiles, one byte per
+	pixel and 64 bytes per tile, in tile order.
+	"""
+	file_out = open(file_name, "wb")
+	file_out.write(tiles.tobytes())
+	file_out.close()
@@ -6,17 +6,34 @@
 #
 #########################################################
 import os
+import sys
 
-try:
-	REVISION = os.popen('git rev-list HEAD --count').readlines()[0]
-except:
-	REVISION = "Undef!"
+# The git revision, as used for <GIT_REVISION> - see get_revision()
+REVISION = None
+
+def get_revision():
+	"""
+	Return the revision (commit count) of the git repository.
+	
+	Git is only run the first time this is called, rather than whenever this
+	module is imported, as only the <GIT_REVISION> code in the script needs it.
+	"""
+	global REVISION
+	if REVISION is None:
+		try:
+			REVISION = os.popen('git rev-list HEAD --count').readlines()[0]
+		except:
+			REVISION = "Undef!"
+	return REVISION
 
 # Defaults for input, translation and output file name
 # Required for extractScript
 ROM_NAME = "Cyber Knight (J).pce"
 TABLE_NAME = "CyberKnightTranslation.csv"
 TABLE_NAME_DOUBLE = "CyberKnightKanjiTranslation.csv"
+# Compiled copy of both translation tables, rebuilt when either CSV file changes
+# (Python 2 and 3 read the tables differently, so they each have their own)
+TABLE_CACHE_NAME = "CyberKnightTables.py%s.cache" % sys.version_info[0]
 OUT_NAME = "Script.json"
 # Additional requirements for injectScript/mapScript
 OUT_EXPANDED_NAME = "Cyber Knight (J) Expanded.pce"
@@ -33,6 +50,15 @@ ROM_CHECKSUM = "dad257d4984635f70580b10f1ae1b75c"
 ROM_SIZE = 524288
 ROM_BANKS = 64
 BANK_SIZE = 8192
+# Asset banks are two ROM banks, mapped in to PCE memory at 0x4000-0x7FFF
+ASSET_WINDOW = 0x4000
+ASSET_WINDOW_SIZE = BANK_SIZE * 2
+# Where the fonts are held in the ROM, for previewAssets.py (not known yet,
+# look for them in the sheets written by extractAssets.py -g). The 8x8 font
+# is the tiles of byte codes 0x20-0xFF, as loaded in to VRAM from 0x1200; the
+# double height font is the tiles loaded in to VRAM from 0x2000.
+FONT_ROM_ADDRESS = None
+FONT_DOUBLE_ROM_ADDRESS = None
 # PC-Engine games cannot be any bigger than this, other we
 # get in to trouble with needing hardware like the Streetfighter 2 
 # mapper, Arcade Card and other doodads.
@@ -60,6 +86,10 @@ OVERWRITE = False
 # Additional, verbose output about the process
 VERBOSE = False
 
+# How many strings the encoder and decoder each remember, so that repeated
+# strings (<end>, menu labels, NPC names etc) are only translated once
+CODEC_CACHE_SIZE = 4096
+
 # The byte which determines which translation table to use
 SWITCH_MODE = '5C'
 
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+convertAssets.py
+================
+Converts JSON asset files (.dat) to the binary asset container format
+(.cka), as written by the -b option of extractAssets.py, splitAssets.py and
+mapAssets.py.
+
+Every container is read back and checked against the JSON file it was made
+from before it is kept, so the conversion is lossless. The JSON files are
+left where they are.
+
+John Snowdon <john@target-earth.net>
+"""
+
+import os
+import sys
+import time
+import json
+import getopt
+
+######################################################
+########## < Config starts here > ####################
+######################################################
+
+from AssetContainer import pack_asset, unpack_asset, DAT_EXTENSION, CONTAINER_EXTENSION
+
+VERBOSE = False
+OVERWRITE = False
+ASSET_DIRS = ["assets/raw", "assets/split", "assets/converted"]
+
+######################################################
+########## < Functions start here > ##################
+######################################################
+
+def convert_file(dat_name, cka_name):
+	"""
+	Convert one JSON asset file to a container, returning the size of each
+	and how long each took to load (in ms), or None if the container does
+	not read back the same.
+	"""
+	f = open(dat_name, "rb")
+	dat_data = f.read()
+	f.close()
+	start = time.time()
+	asset = json.loads(dat_data.decode("utf-8"))
+	dat_time = (time.time() - start) * 1000.0
+
+	cka_data = pack_asset(asset)
+	if unpack_asset(cka_data) != asset:
+		return None
+	# The tools themselves read containers with raw_bytes
+	start = time.time()
+	unpack_asset(cka_data, raw_bytes = True)
+	cka_time = (time.time() - start) * 1000.0
+
+	f = open(cka_name, "wb")
+	f.write(cka_data)
+	f.close()
+	return len(dat_data), len(cka_data), dat_time, cka_time
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvd:f")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
+	print("")
+	print("convertAssets.py - Convert JSON asset files to binary asset containers for Cyber Knight")
+	print("----------------")
+	print("")
+
+	dirs = []
+	for o, a in opts:
+		if o == "-h":
+			print("A tool which converts the JSON asset files (.dat) in a directory to binary")
+			print("asset containers (.cka), checking that each one reads back the same.")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output")
+			print("-d	Directory of asset files, may be given more than once (default: %s)" % ", ".join(ASSET_DIRS))
+			print("-f	Overwrite existing container files")
+			print("")
+			print("Example:")
+			print("convertAssets.py -d assets/split -f")
+			print("")
+			sys.exit(0)
+
+		if o == "-v":
+			VERBOSE = True
+
+		if o == "-d":
+			dirs.append(a)
+
+		if o == "-f":
+			OVERWRITE = True
+
+	if len(dirs) > 0:
+		ASSET_DIRS = dirs
+
+	totals = [0, 0, 0.0, 0.0]
+	converted = 0
+	skipped = 0
+	failed = 0
+	for asset_dir in ASSET_DIRS:
+		if os.path.isdir(asset_dir):
+			print("Assets Dir: %s <- OK" % asset_dir)
+		else:
+			print("Assets Dir: %s <- ERROR, directory not found!" % asset_dir)
+			sys.exit(2)
+
+		for file_name in sorted(os.listdir(asset_dir)):
+			name, extension = os.path.splitext(file_name)
+			if extension != DAT_EXTENSION:
+				continue
+			dat_name = os.path.join(asset_dir, file_name)
+			cka_name = os.path.join(asset_dir, name + CONTAINER_EXTENSION)
+			if os.path.isfile(cka_name) and (OVERWRITE == False):
+				if VERBOSE:
+					print("Skipped %s - an existing container was found" % dat_name)
+				skipped += 1
+				continue
+			result = convert_file(dat_name, cka_name)
+			if result is None:
+				print("%s <- ERROR, container does not read back the same, not written" % dat_name)
+				failed += 1
+				continue
+			if VERBOSE:
+				print("%s -> %s: %s -> %s bytes" % (dat_name, cka_name, result[0], result[1]))
+			for i in range(0, len(totals)):
+				totals[i] += result[i]
+			converted += 1
+	print("")
+
+	print("===============================")
+	print("Converted: %s" % converted)
+	print("Skipped: %s" % skipped)
+	print("Failed: %s" % failed)
+	if converted > 0:
+		print("Size: %s bytes JSON, %s bytes container (%.1fx smaller)" % (totals[0], totals[1], float(totals[0]) / max(totals[1], 1)))
+		print("Load time: %.1fms JSON, %.1fms container" % (totals[2], totals[3]))
+	if failed > 0:
+		sys.exit(1)
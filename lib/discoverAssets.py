@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+"""
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+discoverAssets.py
+================
+Builds the map of asset banks from the pointer tables in the ROM itself,
+and compares it with the hand written map in CyberKnightAssetBanks.py.
+
+An asset bank is two ROM banks, mapped in to PCE memory at 0x4000. It
+starts with its own bank number, followed by a table of little endian
+16-bit PCE addresses, one per asset; the asset index of an asset is the
+offset of its pointer from the start of the bank (0x01, 0x03, 0x05...).
+The table runs up to the lowest address it points to.
+
+Every bank of the ROM is checked for such a table. Assets which are named
+by the asset load tables (the bank and asset index of each script) are
+marked as text.
+
+John Snowdon <john@target-earth.net>
+"""
+
+import os
+import sys
+import time
+import getopt
+import struct
+
+######################################################
+########## < Config starts here > ####################
+######################################################
+
+from config import ROM_NAME, ROM_BANKS, BANK_SIZE, ASSET_WINDOW, ASSET_WINDOW_SIZE
+from Rom import Rom, pce_to_offset
+
+from CyberKnightAssetBanks import ASSETS, ASSET_LOAD_TABLE, ASSET_OFFSET_TABLE
+from CyberKnightAssetBanks import ASSET_LOAD_TABLE_SIZE, ASSET_OFFSET_TABLE_SIZE
+
+VERBOSE = False
+OUT_NAME = None
+
+######################################################
+########## < Functions start here > ##################
+######################################################
+
+def read_load_tables(rom):
+	"""
+	The (bank, asset index) pairs named by the asset load tables, in order.
+	"""
+	banks = struct.unpack_from("<%sB" % ASSET_LOAD_TABLE_SIZE, rom.data, ASSET_LOAD_TABLE)
+	indexes = struct.unpack_from("<%sB" % ASSET_OFFSET_TABLE_SIZE, rom.data, ASSET_OFFSET_TABLE)
+	return list(zip(banks, indexes))
+
+def read_bank(rom, bank):
+	"""
+	Decode the pointer table at the start of a bank, returning the assets it
+	points to by asset index, or None (and the reason) if it does not hold one.
+	"""
+	start = bank * BANK_SIZE
+	if start + ASSET_WINDOW_SIZE > len(rom):
+		return None, "bank runs past the end of the ROM"
+	(bank_id,) = struct.unpack_from("<B", rom.data, start)
+	if bank_id != bank:
+		return None, "starts with %s, not its bank number" % hex(bank_id)
+
+	assets = {}
+	offset = 1
+	table_end = ASSET_WINDOW_SIZE
+	while offset + 2 <= table_end:
+		(value,) = struct.unpack_from("<H", rom.data, start + offset)
+		if value < ASSET_WINDOW + offset + 2 or value >= ASSET_WINDOW + ASSET_WINDOW_SIZE:
+			return None, "pointer %s at %s is outside the bank" % (hex(value), hex(start + offset))
+		# The table can not run past the lowest asset it points to
+		table_end = min(table_end, value - ASSET_WINDOW)
+		assets[offset] = {
+			"asset_index" : offset,
+			"asset_rom_pointer_value" : value,
+			"asset_rom_pointer_address" : pce_to_offset(bank, value),
+			"asset_type" : "",
+		}
+		offset += 2
+	return assets, None
+
+def discover_assets(rom):
+	"""
+	Build an ASSETS structure, in the same form as CyberKnightAssetBanks.ASSETS,
+	from the pointer tables of every bank in the ROM.
+	"""
+	loaded = read_load_tables(rom)
+	assets = {"asset_banks" : {}}
+	for bank in range(0, min(ROM_BANKS, rom.banks())):
+		bank_assets, reason = read_bank(rom, bank)
+		if bank_assets is None:
+			if VERBOSE and bank in [b for b, i in loaded]:
+				print("Bank %s is named by the asset load table, but %s" % (hex(bank), reason))
+			continue
+		for b, i in loaded:
+			if b == bank and i in bank_assets:
+				bank_assets[i]["asset_type"] = "text"
+		assets["asset_banks"][bank] = {
+			"asset_bank" : bank,
+			"asset_bank_rom_start_address" : bank * BANK_SIZE,
+			"asset_bank_rom_end_address" : bank * BANK_SIZE + ASSET_WINDOW_SIZE - 1,
+			"assets" : bank_assets,
+		}
+	return assets
+
+def diff_assets(old, new):
+	"""
+	The differences between two ASSETS structures, as a list of lines.
+	"""
+	lines = []
+	old_banks = old["asset_banks"]
+	new_banks = new["asset_banks"]
+	for bank in sorted(set(old_banks.keys()) | set(new_banks.keys())):
+		if bank not in new_banks:
+			lines.append("- bank %s: not found in the ROM" % hex(bank))
+			continue
+		if bank not in old_banks:
+			lines.append("+ bank %s: %s assets, not in CyberKnightAssetBanks.py" % (hex(bank), len(new_banks[bank]["assets"])))
+			continue
+		for k in ["asset_bank_rom_start_address", "asset_bank_rom_end_address"]:
+			if old_banks[bank][k] != new_banks[bank][k]:
+				lines.append("! bank %s: %s is %s, ROM has %s" % (hex(bank), k, hex(old_banks[bank][k]), hex(new_banks[bank][k])))
+		old_assets = old_banks[bank]["assets"]
+		new_assets = new_banks[bank]["assets"]
+		for asset_index in sorted(set(old_assets.keys()) | set(new_assets.keys())):
+			asset_id = "%s.%s" % (hex(bank), hex(asset_index))
+			if asset_index not in new_assets:
+				lines.append("- asset %s: not found in the ROM" % asset_id)
+				continue
+			if asset_index not in old_assets:
+				lines.append("+ asset %s: %s, not in CyberKnightAssetBanks.py" % (asset_id, hex(new_assets[asset_index]["asset_rom_pointer_address"])))
+				continue
+			for k in ["asset_rom_pointer_value", "asset_rom_pointer_address"]:
+				if old_assets[asset_index][k] != new_assets[asset_index][k]:
+					lines.append("! asset %s: %s is %s, ROM has %s" % (asset_id, k, hex(old_assets[asset_index][k]), hex(new_assets[asset_index][k])))
+			if old_assets[asset_index]["asset_type"] != new_assets[asset_index]["asset_type"]:
+				lines.append("! asset %s: asset_type is '%s', ROM has '%s'" % (asset_id, old_assets[asset_index]["asset_type"], new_assets[asset_index]["asset_type"]))
+	return lines
+
+def format_assets(assets):
+	"""
+	Python source for an ASSETS structure, laid out as in CyberKnightAssetBanks.py.
+	"""
+	lines = []
+	lines.append("ASSETS = {")
+	lines.append("	\"asset_banks\" : {")
+	for bank in sorted(assets["asset_banks"].keys()):
+		asset_bank = assets["asset_banks"][bank]
+		lines.append("		0x%02X : {" % bank)
+		lines.append("			\"asset_bank\" : 0x%02X," % bank)
+		lines.append("			\"asset_bank_rom_start_address\" : 0x%05X," % asset_bank["asset_bank_rom_start_address"])
+		lines.append("			\"asset_bank_rom_end_address\" : 0x%05X," % asset_bank["asset_bank_rom_end_address"])
+		lines.append("			\"assets\" : {")
+		for asset_index in sorted(asset_bank["assets"].keys()):
+			asset = asset_bank["assets"][asset_index]
+			lines.append("				0x%02X : {" % asset_index)
+			lines.append("					\"asset_index\" : 0x%02X," % asset_index)
+			lines.append("					\"asset_rom_pointer_value\" : 0x%04X," % asset["asset_rom_pointer_value"])
+			lines.append("					\"asset_rom_pointer_address\" : 0x%05X," % asset["asset_rom_pointer_address"])
+			lines.append("					\"asset_type\" : \"%s\"" % asset["asset_type"])
+			lines.append("				},")
+		lines.append("			}")
+		lines.append("		},")
+	lines.append("	}")
+	lines.append("}")
+	return "\n".join(lines)
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvi:o:")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
+	print("")
+	print("discoverAssets.py - Asset bank map discovery for Cyber Knight")
+	print("----------------")
+	print("")
+
+	for o, a in opts:
+		if o == "-h":
+			print("A tool which reads the asset bank pointer tables from the ROM, builds the")
+			print("asset map from them and shows how it differs from CyberKnightAssetBanks.py")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output")
+			print("-i	Input file name (e.g. 'Cyber Knight (J).pce')")
+			print("-o	Write the generated asset map as Python source to this file")
+			print("")
+			print("Example:")
+			print("discoverAssets.py -i 'Cyber Knight (J).pce' -o CyberKnightAssetBanks.generated.py")
+			print("")
+			sys.exit(0)
+
+		if o == "-v":
+			VERBOSE = True
+
+		if o == "-i":
+			ROM_NAME = a
+
+		if o == "-o":
+			OUT_NAME = a
+
+	if os.path.isfile(ROM_NAME):
+		print("Input ROM File: %s <- OK" % ROM_NAME)
+	else:
+		print("Input ROM File: %s <- ERROR, input file not found!" % ROM_NAME)
+		sys.exit(2)
+	print("")
+
+	start = time.time()
+	rom = Rom(ROM_NAME)
+	assets = discover_assets(rom)
+	differences = diff_assets(ASSETS, assets)
+	elapsed = (time.time() - start) * 1000.0
+	rom.close()
+
+	for bank in sorted(assets["asset_banks"].keys()):
+		bank_assets = assets["asset_banks"][bank]["assets"]
+		print("Bank %s: %s assets, %s text" % (hex(bank), len(bank_assets), len([a for a in bank_assets.values() if a["asset_type"] == "text"])))
+	print("")
+
+	if len(differences) > 0:
+		print("Differences from CyberKnightAssetBanks.py")
+		print("=========================================")
+		for line in differences:
+			print(line)
+	else:
+		print("CyberKnightAssetBanks.py matches the ROM")
+	print("")
+
+	if OUT_NAME is not None:
+		f = open(OUT_NAME, "w")
+		f.write("#!/usr/bin/env python\n")
+		f.write("# Generated by discoverAssets.py from %s\n\n" % os.path.basename(ROM_NAME))
+		f.write("ASSET_LOAD_TABLE = 0x%05X\n" % ASSET_LOAD_TABLE)
+		f.write("ASSET_LOAD_TABLE_SIZE = %s\n" % ASSET_LOAD_TABLE_SIZE)
+		f.write("ASSET_OFFSET_TABLE = 0x%05X\n" % ASSET_OFFSET_TABLE)
+		f.write("ASSET_OFFSET_TABLE_SIZE = %s\n\n" % ASSET_OFFSET_TABLE_SIZE)
+		f.write(format_assets(assets))
+		f.write("\n")
+		f.close()
+		print("Generated asset map written to %s" % OUT_NAME)
+
+	print("Discovered %s asset banks in %.1fms" % (len(assets["asset_banks"]), elapsed))
@@ -25,38 +25,30 @@ John Snowdon <john@target-earth.net>
 
 import os
 import sys
-import traceback
 import getopt
-import hashlib
 import binascii
 import math
 
-try:
-	import simplejson as json
-except:
-	print("Warning: Falling back to json")
-	import json
-try:
-	from io import StringIO
-except:
-	print("io not available")
-	
 ######################################################
 ############ < User configuration > ##################
 ######################################################
 
 # Default values
-from config import VERBOSE, REVISION
+from config import VERBOSE, get_revision
 from config import ROM_NAME, OUT_EXPANDED_NAME
 from config import ROM_CHECKSUM, ROM_SIZE, ROM_BANKS, BANK_SIZE, ROM_MAX_SIZE
 
 # Translation table loader
-from Table import load_table, load_table_double
+from Table import get_table, get_table_double
 
-from CyberKnightAssetBanks import ASSETS, ASSET_LOAD_TABLE, ASSET_OFFSET_TABLE
+from CyberKnightAssetBanks import ASSET_LOAD_TABLE, ASSET_OFFSET_TABLE
 from CyberKnightAssetBanks import ASSET_LOAD_TABLE_SIZE, ASSET_OFFSET_TABLE_SIZE
+from AssetCatalog import get_catalog
+from Rom import Rom
+from AssetContainer import read_asset, find_asset_file
+from ScriptString import ScriptString
 
-from translators import encode_text, translate_string
+from translators import get_encoder, translate_bytes, cache_stats
 
 ######################################################
 ########## < Run-time code start here > ##############
@@ -154,7 +146,8 @@ print("")
 print("Checking ROM file")
 print("=================")
 print("Correct checksum: %s" % ROM_CHECKSUM)
-new_rom_checksum = hashlib.md5(open(IN_FILE, 'rb').read()).hexdigest()
+rom = Rom(IN_FILE)
+new_rom_checksum = rom.md5()
 print("Calculated checksum: %s" % new_rom_checksum)
 if ROM_CHECKSUM != new_rom_checksum:
 	print("")
@@ -174,161 +167,174 @@ print("------------------------------")
 TOTAL_PCE_BYTES_SIZE = 0
 TOTAL_ASSET_BANKS = 0
 all_assets = []
-for bank_number in ASSETS["asset_banks"].keys():
-	for asset_number in ASSETS["asset_banks"][bank_number]["assets"].keys():
-		if ASSETS["asset_banks"][bank_number]["assets"][asset_number]["asset_type"] == "text":
-			if os.path.isfile(ASSETS_DIR + "/" + hex(bank_number) + "." + hex(asset_number) + ".dat"):
-				# Load asset structure from the file
-				print("")
-				print("#########################################################")
-				print("Calculating asset data for %s.%s" % (hex(bank_number), hex(asset_number)))
-				asset = json.loads(open(ASSETS_DIR + "/" + hex(bank_number) + "." + hex(asset_number) + ".dat", encoding='utf-8').read())
-				PCE_translated_bytes = 0
-				PCE_original_bytes = 0
-				ttable = load_table()
-				ttable2 = load_table_double()
-				original_delimeters = 0
-				translated_delimeters = 0
-				for asset_chunk in asset["strings"]:
-					translated_string_delimeters = 0
-					original_string_delimeters = 0
-					for b in asset_chunk["bytes"]:
-						if "delimeter_skip" not in asset_chunk.keys():
-							if b == "00":
-								original_delimeters += 1
-								original_string_delimeters += 1
-				
-					PCE_original_bytes += len(asset_chunk["bytes"])
-					# Load english text if translated
-					if len(asset_chunk["PCE_english"])>0:
-						if SHOW_PROGRESS:
-                                                    print("TRANSLATED - %s.%s.%s: %s" % (hex(bank_number), hex(asset_number), asset_chunk["string_number"], asset_chunk["PCE_english"].encode('utf-8')))
-								
-						
-						if "<GIT_REVISION>" in asset_chunk["PCE_english"]:
-							print("------ Found a Git revision control code - replacing with current Git version")
-							print("------ Revision: r%s" % REVISION)
-							asset_chunk["PCE_english"] = asset_chunk["PCE_english"].replace('<GIT_REVISION>', REVISION)
-												
-						# Step 1, encode the text
-						new_bytes = encode_text(string = asset_chunk["PCE_english"], trans_table = ttable, string_number = asset_chunk["string_number"])
-						
-						# Step 2, decode the text back again
-						asset_chunk["translated_bytes"] = new_bytes
-						new_asset_chunk = asset_chunk
-						# Swap the translated bytes with the original bytes field, as that is what 'translate_string' works on
-						new_asset_chunk["original_bytes"] = new_asset_chunk["bytes"]
-						new_asset_chunk["bytes"] = new_asset_chunk["translated_bytes"]
-						new_asset_chunk["text"] = []
-						new_asset_chunk = translate_string(byte_sequence = new_asset_chunk, trans_table = ttable, trans_table_double = ttable2, alt = False, old_assets = False, VERBOSE = VERBOSE)
-						if "delimeter_skip" not in asset_chunk.keys():
-							for b in asset_chunk["translated_bytes"]:
-								if b == "00":
-									translated_string_delimeters += 1
-									translated_delimeters += 1
-
-						s = ""
-						for b in new_asset_chunk["text"]:
-							s += b
-						s = s.replace('\\n', '\n')
-						# Step 3, compare the decoded string to the english text - do they match?
-						# First test is for length:
-						#matched_length = True
-						#if len(s) != len(asset_chunk["PCE_english"]):
-						#	matched_length = False
-						#	print("------------------")
-						#	print("WARNING!! String length does not match")
-						#	print("Asset data: %s.%s, string number: %s" % (asset["bank"], asset["asset_index"], asset_chunk["string_number"]))
-						#	print("-")
-						#	print("Pre-encoded string:")
-						#	print("@%s@" % asset_chunk["PCE_english"].encode('utf-8'))
-						#	print("-")
-						#	print("Decoded string:")
-						#	print("@%s@" % s)
-						#	print("-")
-						#	print("Pre-encoded size: @%s@" % len(asset_chunk["PCE_english"]))
-						#	print("Decoded size: @%s@" % len(s))
-						#	idx = 0
-						#	for c in s:
-						#		sys.stdout.write("%s" % c)
-							#	idx += 1	
-						#	print("Please fix this error!")
-						#	sys.exit(2)
-						
-						# Second test is for character match:
-						#if matched_length == True:
-						#	matched = True
-						#	processed = ""
-						#	mismatch_pre = ""
-						#	mismatch_post = ""	
-						#	if matched is False:
-						#		print("WARNING!! Strings do not match")
-						#		print("Asset data: %s.%s, string number: %s" % (asset["bank"], asset["asset_index"], asset_chunk["string_number"]))
-						#		print("-")
-						#		print("Pre-encoded string:")
-						#		print("@%s@" % asset_chunk["PCE_english"])
-						#		print("-")
-						#		print("Decoded string:")
-						#		print("@%s@" % s)
-						#		print("-")
-						#		print("Pre-encoded character: @%s@" % mismatch_pre)
-						#		print("Decoded character: @%s@" % mismatch_post)
-						#		print("String match extend: @%s@" % processed)
-						#		print("Please fix this error!")
-						#		sys.exit(2)
-							
-						#if SHOW_PROGRESS:
-							#print("---- new_asset_chunk[text]: %s" % s)
-							
-						PCE_translated_bytes += len(new_bytes)
-						
-						# Have we got the same amount of <end> bytes?
-						if DELIMETER_CHECK:
-							if original_string_delimeters != translated_string_delimeters:
-								print("")
-								print("---- WARNING!! String delimeters do not match")
-								print("---- Asset data: %s.%s.%s" % (asset["bank"], asset["asset_index"], asset_chunk["string_number"]))
-								print("---- Original delimeters: %s" % original_string_delimeters)
-								print("---- Translated delimeters: %s" % translated_string_delimeters)
-								print("---- Please fix this error!")
-								print("")
-								#sys.exit(2)
+for text_asset in get_catalog().text_assets():
+	bank_number = text_asset["bank"]
+	asset_number = text_asset["asset_index"]
+	asset_file = find_asset_file(ASSETS_DIR, hex(bank_number) + "." + hex(asset_number))
+	if asset_file is not None:
+		# Load asset structure from the file
+		print("")
+		print("#########################################################")
+		print("Calculating asset data for %s.%s" % (hex(bank_number), hex(asset_number)))
+		asset = read_asset(asset_file, raw_bytes = True)
+		try:
+			asset["strings"] = [ScriptString.from_asset(s) for s in asset["strings"]]
+		except ValueError as e:
+			print("ERROR - Asset data %s.%s: %s" % (asset["bank"], asset["asset_index"], e))
+			sys.exit(2)
+		PCE_translated_bytes = 0
+		PCE_original_bytes = 0
+		ttable = get_table()
+		ttable2 = get_table_double()
+		encoder = get_encoder(ttable)
+		original_delimeters = 0
+		translated_delimeters = 0
+		# The text (or original bytes, if untranslated) of each string, in order
+		pieces = []
+		string_numbers = []
+		string_delimeters = []
+		for asset_chunk in asset["strings"]:
+			original_string_delimeters = 0
+			original_bytes = asset_chunk.bytes
+			if not asset_chunk.has_extra("delimeter_skip"):
+				original_delimeters += original_bytes.count(b"\x00")
+				original_string_delimeters += original_bytes.count(b"\x00")
+		
+			PCE_original_bytes += len(original_bytes)
+			# Load english text if translated
+			if len(asset_chunk.PCE_english)>0:
+				if SHOW_PROGRESS:
+					print("TRANSLATED - %s.%s.%s: %s" % (hex(bank_number), hex(asset_number), asset_chunk.string_number, asset_chunk.PCE_english.encode('utf-8')))
 						
-					else:
-						if SHOW_PROGRESS:
-							print("UNTRANSLATED %s.%s.%s: %s" % (hex(bank_number), hex(asset_number), asset_chunk["string_number"], asset_chunk["PCE_japanese"].encode('utf-8')))
-							
-						# Otherwise load Japanese text
-						for b in asset_chunk["bytes"]:
-							if b == "00":
-								translated_delimeters += 1
-						asset_chunk["translated_bytes"] = asset_chunk["bytes"]
-						PCE_translated_bytes += len(asset_chunk["bytes"])
-					#if SHOW_PROGRESS:
-					#	print("----------------------- End -----------------------")
-					#	print("")
-
-				all_assets.append(asset)
+				
+				if "<GIT_REVISION>" in asset_chunk.PCE_english:
+					print("------ Found a Git revision control code - replacing with current Git version")
+					print("------ Revision: r%s" % get_revision())
+					asset_chunk.PCE_english = asset_chunk.PCE_english.replace('<GIT_REVISION>', get_revision())
+				pieces.append(asset_chunk.PCE_english)
+			else:
+				if SHOW_PROGRESS:
+					print("UNTRANSLATED %s.%s.%s: %s" % (hex(bank_number), hex(asset_number), asset_chunk.string_number, asset_chunk.PCE_japanese.encode('utf-8')))
+					
+				# Otherwise load Japanese text
+				translated_delimeters += original_bytes.count(b"\x00")
+				pieces.append(bytearray(original_bytes))
+			string_numbers.append(asset_chunk.string_number)
+			string_delimeters.append(original_string_delimeters)
+			#if SHOW_PROGRESS:
+			#	print("----------------------- End -----------------------")
+			#	print("")
+		
+		# Step 1, encode the text of the whole asset in to one buffer
+		asset_bytes, string_offsets, string_lengths = encoder.encode_many(pieces, string_numbers)
+		asset_view = memoryview(asset_bytes)
+		PCE_translated_bytes = len(asset_bytes)
+		
+		for idx in range(0, len(asset["strings"])):
+			asset_chunk = asset["strings"][idx]
+			if isinstance(pieces[idx], bytearray):
+				continue
+			start = string_offsets[idx]
+			end = start + string_lengths[idx]
+			translated_string_delimeters = 0
+			original_string_delimeters = string_delimeters[idx]
+			
+			# Step 2, decode the text back again
+			text = translate_bytes(asset_view[start:end], trans_table = ttable, trans_table_double = ttable2)
+			if not asset_chunk.has_extra("delimeter_skip"):
+				translated_string_delimeters += asset_bytes.count(b"\x00", start, end)
+				translated_delimeters += asset_bytes.count(b"\x00", start, end)
 
-				asset_required_banks = int(math.ceil(PCE_translated_bytes / (BANK_SIZE * 1.0)))
-				TOTAL_ASSET_BANKS += asset_required_banks
-				TOTAL_PCE_BYTES_SIZE += PCE_translated_bytes
-				asset["required_banks"] = asset_required_banks
-				print("- %s.%s" %  (hex(bank_number), hex(asset_number)))
-				print("-- Translated script == %s == %s bank(s) == %s bytes" % (PCE_translated_bytes, asset_required_banks, asset_required_banks * BANK_SIZE))
-				print("-- Translated delimeters == %s" % translated_delimeters)
-				print("-- Original script == %s == %s bank(s) == %s bytes" % (PCE_original_bytes, asset_required_banks, asset_required_banks * BANK_SIZE))
-				print("-- Original delimeters == %s" % original_delimeters)
-				if asset_required_banks > 2:
+			s = ""
+			for b in text:
+				s += b
+			s = s.replace('\\n', '\n')
+			# Step 3, compare the decoded string to the english text - do they match?
+			# First test is for length:
+			#matched_length = True
+			#if len(s) != len(asset_chunk["PCE_english"]):
+			#	matched_length = False
+			#	print("------------------")
+			#	print("WARNING!! String length does not match")
+			#	print("Asset data: %s.%s, string number: %s" % (asset["bank"], asset["asset_index"], asset_chunk["string_number"]))
+			#	print("-")
+			#	print("Pre-encoded string:")
+			#	print("@%s@" % asset_chunk["PCE_english"].encode('utf-8'))
+			#	print("-")
+			#	print("Decoded string:")
+			#	print("@%s@" % s)
+			#	print("-")
+			#	print("Pre-encoded size: @%s@" % len(asset_chunk["PCE_english"]))
+			#	print("Decoded size: @%s@" % len(s))
+			#	idx = 0
+			#	for c in s:
+			#		sys.stdout.write("%s" % c)
+				#	idx += 1	
+			#	print("Please fix this error!")
+			#	sys.exit(2)
+			
+			# Second test is for character match:
+			#if matched_length == True:
+			#	matched = True
+			#	processed = ""
+			#	mismatch_pre = ""
+			#	mismatch_post = ""	
+			#	if matched is False:
+			#		print("WARNING!! Strings do not match")
+			#		print("Asset data: %s.%s, string number: %s" % (asset["bank"], asset["asset_index"], asset_chunk["string_number"]))
+			#		print("-")
+			#		print("Pre-encoded string:")
+			#		print("@%s@" % asset_chunk["PCE_english"])
+			#		print("-")
+			#		print("Decoded string:")
+			#		print("@%s@" % s)
+			#		print("-")
+			#		print("Pre-encoded character: @%s@" % mismatch_pre)
+			#		print("Decoded character: @%s@" % mismatch_post)
+			#		print("String match extend: @%s@" % processed)
+			#		print("Please fix this error!")
+			#		sys.exit(2)
+				
+			#if SHOW_PROGRESS:
+				#print("---- new_asset_chunk[text]: %s" % s)
+				
+			# Have we got the same amount of <end> bytes?
+			if DELIMETER_CHECK:
+				if original_string_delimeters != translated_string_delimeters:
 					print("")
-					print("-- WARNING!")
-					print("-- WARNING! This asset requires more than 2 banks!!")
-					print("-- WARNING! This should not happen!!")
-					print("-- WARNING!")
-			else:
-				print("Sorry, there isn't a matching asset in %s for bank %s, asset %s" % (ASSET_DIR, bank_number, asset_number))
-				print("Did you forget to copy your asset files as generated by mapAssets.py?")
-				sys.exit(2)
+					print("---- WARNING!! String delimeters do not match")
+					print("---- Asset data: %s.%s.%s" % (asset["bank"], asset["asset_index"], asset_chunk.string_number))
+					print("---- Original delimeters: %s" % original_string_delimeters)
+					print("---- Translated delimeters: %s" % translated_string_delimeters)
+					print("---- Please fix this error!")
+					print("")
+					#sys.exit(2)
+		
+		# The relocation step writes the packed buffer as it is
+		asset["translated_bytes"] = asset_bytes
+		asset["string_offsets"] = string_offsets
+		asset["string_lengths"] = string_lengths
+		all_assets.append(asset)
+
+		asset_required_banks = int(math.ceil(PCE_translated_bytes / (BANK_SIZE * 1.0)))
+		TOTAL_ASSET_BANKS += asset_required_banks
+		TOTAL_PCE_BYTES_SIZE += PCE_translated_bytes
+		asset["required_banks"] = asset_required_banks
+		print("- %s.%s" %  (hex(bank_number), hex(asset_number)))
+		print("-- Translated script == %s == %s bank(s) == %s bytes" % (PCE_translated_bytes, asset_required_banks, asset_required_banks * BANK_SIZE))
+		print("-- Translated delimeters == %s" % translated_delimeters)
+		print("-- Original script == %s == %s bank(s) == %s bytes" % (PCE_original_bytes, asset_required_banks, asset_required_banks * BANK_SIZE))
+		print("-- Original delimeters == %s" % original_delimeters)
+		if asset_required_banks > 2:
+			print("")
+			print("-- WARNING!")
+			print("-- WARNING! This asset requires more than 2 banks!!")
+			print("-- WARNING! This should not happen!!")
+			print("-- WARNING!")
+	else:
+		print("Sorry, there isn't a matching asset in %s for bank %s, asset %s" % (ASSET_DIR, bank_number, asset_number))
+		print("Did you forget to copy your asset files as generated by mapAssets.py?")
+		sys.exit(2)
 print("")
 all_assets.sort()
 
@@ -348,6 +354,8 @@ else:
 print("Total asset size %s bytes" % TOTAL_PCE_BYTES_SIZE)
 print("Total bank size %s x %s = %s bytes" % (TOTAL_ASSET_BANKS, BANK_SIZE, (TOTAL_ASSET_BANKS * BANK_SIZE)))
 print("Total wasted bytes %s - %s = %s bytes" % ((TOTAL_ASSET_BANKS * BANK_SIZE), TOTAL_PCE_BYTES_SIZE, ((TOTAL_ASSET_BANKS * BANK_SIZE) - TOTAL_PCE_BYTES_SIZE)))
+if VERBOSE:
+	cache_stats()
 	
 #####################################################################
 #
@@ -371,13 +379,12 @@ else:
 		print("Proceeding to expand file")
 		print("-------------------------")
 		print("Reading original file")
-		rom_bytes = open(IN_FILE, "rb").read()
-		if (len(rom_bytes)) != ROM_SIZE:
-			print("WARNING! File size does not match expected: %s != %s" % (len(rom_bytes), ROM_SIZE))
+		if (len(rom)) != ROM_SIZE:
+			print("WARNING! File size does not match expected: %s != %s" % (len(rom), ROM_SIZE))
 			sys.exit(2)
 		new_rom = open(OUT_FILE, "wb")
 		print("Writing original file contents from 0x0-%s [%s bytes]" % (hex(ROM_SIZE), ROM_SIZE))
-		new_rom.write(rom_bytes)
+		new_rom.write(rom.data)
 		bytes_written = 0
 		b = "00"
 		print("Filling with 0x%s from %s-%s [%s bytes]" % (b, hex(ROM_SIZE), hex(ROM_SIZE + (TOTAL_ASSET_BANKS * BANK_SIZE)), (TOTAL_ASSET_BANKS * BANK_SIZE)))
@@ -399,22 +406,11 @@ print("")
 # Patch the table low in the rom file with the bank numbers of the patched and injected assets.
 try:
 	print("Reading asset load table at 0x%s-0x%s" % (hex(ASSET_LOAD_TABLE), hex(ASSET_LOAD_TABLE + ASSET_LOAD_TABLE_SIZE)))
-	new_rom = open(OUT_FILE, "rb")
-	new_rom.seek(ASSET_LOAD_TABLE, 0)
-	asset_table_bytes = new_rom.read(ASSET_LOAD_TABLE_SIZE)
-	asset_table = []
-	for byte in asset_table_bytes:
-		asset_table.append(byte)
-	new_rom.close()
+	# The expanded file starts with the original, so read the tables from that
+	asset_table = list(bytes(rom.slice(ASSET_LOAD_TABLE, ASSET_LOAD_TABLE + ASSET_LOAD_TABLE_SIZE)))
 	
 	print("Reading asset pointer table at 0x%s-0x%s" % (hex(ASSET_OFFSET_TABLE), hex(ASSET_OFFSET_TABLE + ASSET_OFFSET_TABLE_SIZE)))
-	new_rom = open(OUT_FILE, "rb")
-	new_rom.seek(ASSET_OFFSET_TABLE, 0)
-	asset_pointer_bytes = new_rom.read(ASSET_OFFSET_TABLE_SIZE)
-	asset_pointer = []
-	for byte in asset_pointer_bytes:
-		asset_pointer.append(byte)
-	new_rom.close()
+	asset_pointer = list(bytes(rom.slice(ASSET_OFFSET_TABLE, ASSET_OFFSET_TABLE + ASSET_OFFSET_TABLE_SIZE)))
 except Exception as e:
 	print("ERROR - Error while reading asset tables")
 	print(e)
@@ -454,10 +450,7 @@ while c < ASSET_LOAD_TABLE_SIZE:
 			this_index = 0x01
 			
 			#print("-- %s.%s" % (asset_chunk["bank"], asset_chunk["asset_index"]))
-			byte_size = 0
-			translated_bytes = []
-			for string in asset["strings"]:
-				translated_bytes += string["translated_bytes"]
+			translated_bytes = asset["translated_bytes"]
 			byte_size = len(translated_bytes)
 			
 			print("- %s.%s - relocating to bank %s as asset %s at %s [%s bytes]" % (bank, asset_number, hex(this_bank), hex(this_index), hex(this_location), byte_size))
@@ -486,8 +479,7 @@ while c < ASSET_LOAD_TABLE_SIZE:
 			print("--- Seeking to 0x%s" % hex(this_location + len(new_table)))
 			new_rom.seek(this_location + len(new_table), 0)
 			print("--- Writing asset data")
-			for text_byte in translated_bytes:
-				new_rom.write(binascii.unhexlify(text_byte))
+			new_rom.write(translated_bytes)
 			
 			new_rom.close()
 			
@@ -558,3 +550,5 @@ else:
 		new_rom.write(binascii.unhexlify(new_byte))
 	new_rom.close()
 	print("Done")
+
+rom.close()
\ No newline at end of file
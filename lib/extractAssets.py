@@ -26,14 +26,9 @@ John Snowdon <john@target-earth.net>
 """
 
 import os
-import time
-import codecs
 import sys
-import traceback
+import time
 import getopt
-import struct
-import binascii
-import json
 
 ######################################################
 ########## < Config starts here > ####################
@@ -41,188 +36,286 @@ import json
 
 VERBOSE = False
 OVERWRITE = False
+BINARY = False
 ROM_NAME = "Cyber Knight (J).pce"
 OUT_DIR = "assets/raw"
+# multiprocessing is only imported when there is more than one worker
+WORKERS = 1
+# Where to write the graphics of the asset banks, if anywhere
+GRAPHICS_DIR = None
+GRAPHICS_INDEX = "index.json"
 
 from CyberKnightAssetBanks import ASSETS, ASSET_LOAD_TABLE, ASSET_OFFSET_TABLE
 from CyberKnightAssetBanks import ASSET_LOAD_TABLE_SIZE, ASSET_OFFSET_TABLE_SIZE
+from AssetCatalog import get_catalog
+from Rom import Rom
+from AssetContainer import save_asset, DAT_EXTENSION, CONTAINER_EXTENSION
+from Manifest import Manifest, data_hash
 
 ASSET_BANKS = ASSETS["asset_banks"].keys()
 
+######################################################
+########## < Functions start here > ##################
 ######################################################
 
-def find_next_address(upper_address = None, current_asset = None, assets = []):
-	""" Return the upper address for a given asset """
+def raw_asset(rom, bank, asset):
+	"""
+	The raw asset file of a text asset, the same as it reads back from the
+	file written by this tool, but with asset_chunk as a bytearray.
+	"""
+	return {
+		"bank" : u"%s" % hex(bank),
+		"asset_index" : u"%s" % hex(asset["asset_index"]),
+		"asset_rom_pointer_value" : u"%s" % hex(asset["asset_rom_pointer_value"]),
+		"asset_rom_pointer_address" : u"%s" % hex(asset["asset_rom_pointer_address"]),
+		"asset_rom_pointer_address_limit" : u"%s" % hex(asset["asset_rom_pointer_address_limit"]),
+		"asset_size" : asset["asset_size"],
+		"asset_chunk" : bytearray(rom.asset(bank, asset["asset_index"])),
+	}
 
-	# Next address defaults to the upper region for this asset bank
-	next_address = upper_address
-	lowest_asset_address = upper_address
-	for asset in assets:
-			
-			## Skip anything with a lower starting address than our current asset
-			if asset["asset_rom_pointer_address"] <= current_asset["asset_rom_pointer_address"]:
-				pass
-			else:
-				# If this asset has a lower address than the end address of this asset bank
-				# then it could be the next in sequence, we'll know once we've looped through
-				# all remaining assets
-				if (asset["asset_rom_pointer_address"] <= lowest_asset_address) and (asset["asset_index"] != current_asset["asset_index"]):
-					lowest_asset_address = asset["asset_rom_pointer_address"]
-					next_address = lowest_asset_address
-				else:
-					pass
-	
-	if VERBOSE:
-		print("-----> %s: %s - %s [%s bytes]" % (hex(current_asset["asset_index"]), hex(current_asset["asset_rom_pointer_address"]), hex(next_address), (next_address - current_asset["asset_rom_pointer_address"])))
-	return next_address
+def asset_hash(rom, bank, asset):
+	"""
+	The hash of everything a raw asset file is made from: where the asset
+	is in the ROM, and its bytes.
+	"""
+	region = "%x:%x:%x:" % (asset["asset_rom_pointer_value"], asset["asset_rom_pointer_address"], asset["asset_rom_pointer_address_limit"])
+	return data_hash(region.encode("ascii") + bytes(bytearray(rom.asset(bank, asset["asset_index"]))))
+
+# The ROM, opened once in each worker
+ROM = None
+
+def init_worker(rom_name):
+	"""
+	Open the ROM in a worker process.
+	"""
+	global ROM
+	ROM = Rom(rom_name)
+
+def extract_file(job):
+	"""
+	Write out one text asset. The job is the bank, the asset (as held by the
+	asset catalog) and the output file name.
+	"""
+	(bank, asset, file_name) = job
+	save_asset(file_name, raw_asset(ROM, bank, asset))
+	return file_name
+
+def extract_graphics(rom, graphics_dir):
+	"""
+	Write every asset bank, and each of the assets in them which are not
+	text, as sheets of 4bpp tiles: a PNG file to look at and a raw file of
+	the colour number of each pixel, one byte per pixel and 64 bytes per
+	tile. An index of what each sheet holds is written alongside them.
+	Returns the number of tiles decoded.
+	"""
+	import json
+	from Tiles import decode_tiles, tile_sheet, write_png, write_raw_tiles, SHEET_COLUMNS
+
+	catalog = get_catalog()
+	regions = []
+	for ab in sorted(ASSET_BANKS):
+		regions.append((hex(ab), ab, None, ASSETS["asset_banks"][ab]["asset_bank_rom_start_address"], ASSETS["asset_banks"][ab]["asset_bank_rom_end_address"] + 1))
+	for asset in catalog.graphics_assets():
+		if asset["bank"] in ASSET_BANKS:
+			regions.append((hex(asset["bank"]) + "." + hex(asset["asset_index"]), asset["bank"], asset["asset_index"], asset["asset_rom_pointer_address"], asset["asset_rom_pointer_address_limit"]))
+
+	index = []
+	total = 0
+	for (name, bank, asset_index, start, limit) in regions:
+		tiles = decode_tiles(rom.slice(start, limit))
+		if len(tiles) == 0:
+			# Too small to hold a tile
+			continue
+		if VERBOSE:
+			print("---> Graphics %s at %s-%s [%s tiles]" % (name, hex(start), hex(limit), len(tiles)))
+		write_png(graphics_dir + "/" + name + ".png", tile_sheet(tiles))
+		write_raw_tiles(graphics_dir + "/" + name + ".raw", tiles)
+		index.append({
+			"name" : name,
+			"bank" : hex(bank),
+			"asset_index" : None if asset_index is None else hex(asset_index),
+			"rom_address" : hex(start),
+			"rom_address_limit" : hex(limit),
+			"tiles" : len(tiles),
+			"sheet_columns" : SHEET_COLUMNS,
+			"png" : name + ".png",
+			"raw" : name + ".raw",
+		})
+		total += len(tiles)
+
+	file_out = open(graphics_dir + "/" + GRAPHICS_INDEX, "w")
+	file_out.write(json.dumps(index, indent = 1, separators = (",", ": ")))
+	file_out.close()
+	return total
 
 ######################################################
 ########## < Run-time code start here > ##############
 ######################################################
 
-try:
-	opts, args = getopt.getopt(sys.argv[1:], "hvi:t:o:f")
-except getopt.GetoptError as err:
-	print(err)
-	sys.exit(2)
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvi:t:o:fbj:g:")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
 
-print("")
-print("extractAssets.py - Asset block extractor for Cyber Knight")
-print("----------------")
-print("")
+	print("")
+	print("extractAssets.py - Asset block extractor for Cyber Knight")
+	print("----------------")
+	print("")
 
-VERBOSE = False
-OVERWRITE = False
-for o, a in opts:
-	if o == "-h":
-		print("A simple tool for extracting asset blockse from the game 'Cyber Knight' for the PC-Engine.")
-		print("The tool scans the asset blocks as described within 'CyberKnightAssets.py")
-		print("")
-		print("Options:")
-		print("-h	Show help text")
-		print("-v	Enable verbose output")
-		print("-i	Input file name (e.g. 'Cyber Knight (J).pce')")
-		print("-o	Output file name (e.g. 'Cyber Knight.json')")
-		print("-f	Force overwite of output file even if it already exists")
-		print("")
-		print("Example:")
-		print("extractAssets.py -i 'Cyber Knight (J).pce' -o 'CyberKnight Assets.json'")
-		print("")
-		sys.exit(0)
+	VERBOSE = False
+	OVERWRITE = False
+	for o, a in opts:
+		if o == "-h":
+			print("A simple tool for extracting asset blockse from the game 'Cyber Knight' for the PC-Engine.")
+			print("The tool scans the asset blocks as described within 'CyberKnightAssets.py")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output")
+			print("-i	Input file name (e.g. 'Cyber Knight (J).pce')")
+			print("-o	Output file name (e.g. 'Cyber Knight.json')")
+			print("-f	Force overwite of output files, re-extracting every asset (otherwise only assets changed since the last run are extracted)")
+			print("-b	Write compact binary asset files (.cka) instead of JSON (.dat)")
+			print("-j	Number of worker processes (default: %s)" % WORKERS)
+			print("-g	Also write the asset banks and their non-text assets as sheets of graphics tiles (PNG and raw) to this directory (needs NumPy)")
+			print("")
+			print("Example:")
+			print("extractAssets.py -i 'Cyber Knight (J).pce' -o 'CyberKnight Assets.json'")
+			print("")
+			sys.exit(0)
 		
-	if o == "-v":
-		VERBOSE = True
+		if o == "-v":
+			VERBOSE = True
 		
-	if o == "-i":
-		ROM_NAME = a
+		if o == "-i":
+			ROM_NAME = a
 
-	if o == "-o":
-		OUT_NAME = a
+		if o == "-o":
+			OUT_NAME = a
 		
-	if o == "-f":
-		OVERWRITE = True
-
-print("Configuration")
-print("=============")
-print("Verbose: %s" % VERBOSE)
-print("Over-write: %s" % OVERWRITE)
-if os.path.isfile(ROM_NAME):
-	print("Input ROM File: %s <- OK" % ROM_NAME)
-else:
-	print("Input ROM File: %s <- ERROR, input file not found!" % ROM_NAME)
-	sys.exit(2)
-	
-if OVERWRITE is False:
-	if os.path.isdir(OUT_DIR):
-		print("Output Dir: %s <- OK" % OUT_DIR)
+		if o == "-f":
+			OVERWRITE = True
+
+		if o == "-b":
+			BINARY = True
+
+		if o == "-j":
+			WORKERS = int(a)
+
+		if o == "-g":
+			GRAPHICS_DIR = a
+
+	print("Configuration")
+	print("=============")
+	print("Verbose: %s" % VERBOSE)
+	print("Over-write: %s" % OVERWRITE)
+	print("Workers: %s" % WORKERS)
+	if os.path.isfile(ROM_NAME):
+		print("Input ROM File: %s <- OK" % ROM_NAME)
 	else:
-		print("Output Dir: %s <- ERROR, Path does not exist" % OUT_DIR)
+		print("Input ROM File: %s <- ERROR, input file not found!" % ROM_NAME)
 		sys.exit(2)
-
-print("")
-
-try:
-	file_rom = open(ROM_NAME, "ro")
-except Exception as e:
-	print(e)
-
-print("There are %s asset banks defined" % len(ASSET_BANKS))
-for ab in ASSET_BANKS:
-	print("===========================================")
-	print("Bank: %s" % hex(ab))
-	print("---> Contains %s asset pointers" % len(ASSETS["asset_banks"][ab]["assets"].keys()))
-	print("---> Region %s - %s" % (hex(ASSETS["asset_banks"][ab]["asset_bank_rom_start_address"]), hex(ASSETS["asset_banks"][ab]["asset_bank_rom_end_address"])))
-	# In order to know where to start we need to know the lowest asset chunk, 
-	# and its not always the first asset number.
-	lowest_asset_address = ASSETS["asset_banks"][ab]["asset_bank_rom_end_address"]
-	lowest_asset_number = 0x0
 	
-	asset_sequence = []
-	
-	for asset_index in ASSETS["asset_banks"][ab]["assets"].keys():		
-		# Is this the lowest asset start address for this bank?
-		if ASSETS["asset_banks"][ab]["assets"][asset_index]["asset_rom_pointer_address"] < lowest_asset_address:
-			lowest_asset_address = ASSETS["asset_banks"][ab]["assets"][asset_index]["asset_rom_pointer_address"]
-			lowest_asset_number = asset_index
-			
-	lowest_asset = ASSETS["asset_banks"][ab]["assets"][lowest_asset_number]
-	asset_sequence.append(lowest_asset)
-	print("---> Starting asset chunk (%s) located at: %s" % (hex(lowest_asset_number), hex(lowest_asset_address)))
-	if VERBOSE:
-		print("---> Finding next asset sequence")
-			
-	# For each asset, find the upper limit of the region it can be assumed to use
-	# by finding the start address of the next highest asset in the bank.
-	processed_assets = []
-	for asset in ASSETS["asset_banks"][ab]["assets"].values():	
-		next_address = find_next_address(upper_address = ASSETS["asset_banks"][ab]["asset_bank_rom_end_address"], current_asset = asset, assets = ASSETS["asset_banks"][ab]["assets"].values())
-		asset_sequence.append(next_address)			
-		asset["asset_rom_pointer_address_limit"] = next_address
-		processed_assets.append(asset)
-
-	# Processed assets now contains a list of assets for this bank that have the 
-	# upper limit address embedded, so we know how big each of them are!
-	#print processed_assets
-	if VERBOSE:
-		print("")	
-		print("Seek to %s for first asset chunk" % hex(lowest_asset["asset_rom_pointer_address"]))
-	file_rom.seek(lowest_asset["asset_rom_pointer_address"], 0)
+	if OVERWRITE is False:
+		if os.path.isdir(OUT_DIR):
+			print("Output Dir: %s <- OK" % OUT_DIR)
+		else:
+			print("Output Dir: %s <- ERROR, Path does not exist" % OUT_DIR)
+			sys.exit(2)
+
+	if GRAPHICS_DIR is not None:
+		if os.path.isdir(GRAPHICS_DIR):
+			print("Graphics Dir: %s <- OK" % GRAPHICS_DIR)
+		else:
+			print("Graphics Dir: %s <- ERROR, Path does not exist" % GRAPHICS_DIR)
+			sys.exit(2)
+		try:
+			import numpy
+		except ImportError:
+			print("Graphics Dir: %s <- ERROR, NumPy is needed to decode graphics" % GRAPHICS_DIR)
+			sys.exit(2)
+
+	print("")
+
+	# The assets to write out, as jobs for extract_file(), and the manifest
+	# of what each asset already in the output dir was extracted from
+	jobs = []
+	written = []
+	skipped = 0
+	manifest = Manifest(OUT_DIR)
+	rom = Rom(ROM_NAME)
+	print("There are %s asset banks defined" % len(ASSET_BANKS))
+	for ab in ASSET_BANKS:
+		print("===========================================")
+		print("Bank: %s" % hex(ab))
+		print("---> Contains %s asset pointers" % len(ASSETS["asset_banks"][ab]["assets"].keys()))
+		print("---> Region %s - %s" % (hex(ASSETS["asset_banks"][ab]["asset_bank_rom_start_address"]), hex(ASSETS["asset_banks"][ab]["asset_bank_rom_end_address"])))
+		# The catalog holds the assets of the bank in address order, each with the
+		# upper limit of the region it can be assumed to use (the start address of
+		# the next highest asset in the bank), so the lowest is the first of them.
+		processed_assets = get_catalog().bank_assets[ab]
+		lowest_asset = processed_assets[0]
+		print("---> Starting asset chunk (%s) located at: %s" % (hex(lowest_asset["asset_index"]), hex(lowest_asset["asset_rom_pointer_address"])))
+		if VERBOSE:
+			for asset in processed_assets:
+				print("-----> %s: %s - %s [%s bytes]" % (hex(asset["asset_index"]), hex(asset["asset_rom_pointer_address"]), hex(asset["asset_rom_pointer_address_limit"]), asset["asset_size"]))
+
+		# Processed assets now contains a list of assets for this bank that have the 
+		# upper limit address embedded, so we know how big each of them are!
+		#print processed_assets
 	
-	# Write out each of the asset blocks
-	for asset in processed_assets:
-		# Only process text assets
-		if asset["asset_type"] == "text":
-			print("---> Extract script asset %s at %s-%s" % (hex(asset["asset_index"]), hex(asset["asset_rom_pointer_address"]), hex(asset["asset_rom_pointer_address_limit"])))
-			chunk_size = asset["asset_rom_pointer_address_limit"] - asset["asset_rom_pointer_address"]
-			file_rom.seek(asset["asset_rom_pointer_address"], 0)
-			asset_chunk = file_rom.read(chunk_size)
+		# Write out each of the asset blocks
+		for asset in processed_assets:
+			# Only process text assets
+			if asset["asset_type"] == "text":
+				print("---> Extract script asset %s at %s-%s" % (hex(asset["asset_index"]), hex(asset["asset_rom_pointer_address"]), hex(asset["asset_rom_pointer_address_limit"])))
 			
-			# Write out a JSON file of the asset data and metadata that goes with it.
-			# check file
-			new_fname = OUT_DIR + "/" + hex(ab) + "." + hex(asset["asset_index"]) + ".dat"
-			if OVERWRITE is False:
-				if os.path.isfile(new_fname):
-					print("Output File: %s <- Error, output file already exists" % new_fname)
-					sys.exit(2)
-			file_out = open(new_fname, "w")
-			file_out.write("{\n")
-			file_out.write("	\"bank\" : \"%s\",\n" % hex(ab))
-			file_out.write("	\"asset_index\" : \"%s\",\n" % hex(asset["asset_index"]))
-			file_out.write("	\"asset_rom_pointer_value\" : \"%s\",\n" % hex(asset["asset_rom_pointer_value"]))
-			file_out.write("	\"asset_rom_pointer_address\" : \"%s\",\n" % hex(asset["asset_rom_pointer_address"]))
-			file_out.write("	\"asset_rom_pointer_address_limit\" : \"%s\",\n" % hex(asset["asset_rom_pointer_address_limit"]))
-			file_out.write("	\"asset_size\" : %s,\n" % (asset["asset_rom_pointer_address_limit"] - asset["asset_rom_pointer_address"]))
-			file_out.write("	\"asset_chunk\" : [")
-			# Split the binary asset data by byte, so that the JSON can store it.
-			for c in asset_chunk:
-				file_out.write("\"")
-				file_out.write(str(binascii.hexlify(c)).lower())
-				file_out.write("\", ")
-			file_out.seek(-2, 1)
-			file_out.write("]\n")
-			file_out.write("}")
-			file_out.close()
-	print("")
+				# Write out a JSON file of the asset data and metadata that goes with it.
+				# check file
+				name = hex(ab) + "." + hex(asset["asset_index"])
+				if BINARY:
+					output_name = name + CONTAINER_EXTENSION
+				else:
+					output_name = name + DAT_EXTENSION
+				new_fname = OUT_DIR + "/" + output_name
+				inputs = {"rom" : asset_hash(rom, ab, asset)}
+				if OVERWRITE is False:
+					# Only extract assets which have changed in the ROM since they were
+					# last extracted, and never overwrite a file that was not extracted
+					# by this tool or has been edited since
+					if manifest.unchanged(name, inputs, output_name):
+						print("---> Output File: %s <- unchanged, skipped" % new_fname)
+						skipped += 1
+						continue
+					if os.path.isfile(new_fname) and not manifest.written(name, output_name):
+						print("Output File: %s <- Error, output file already exists" % new_fname)
+						sys.exit(2)
+				jobs.append((ab, asset, new_fname))
+				written.append((name, inputs, output_name))
+		print("")
+
+	if GRAPHICS_DIR is not None:
+		graphics_start = time.time()
+		tiles = extract_graphics(rom, GRAPHICS_DIR)
+		print("Decoded %s graphics tiles in %.3fs, saved in %s" % (tiles, time.time() - graphics_start, GRAPHICS_DIR))
+		print("")
+	rom.close()
 	
-file_rom.close()
-print("Extracted assets are saved in %s" % OUT_DIR)
\ No newline at end of file
+	if WORKERS > 1:
+		import multiprocessing
+		pool = multiprocessing.Pool(WORKERS, initializer = init_worker, initargs = (ROM_NAME,))
+		pool.map(extract_file, jobs)
+		pool.close()
+		pool.join()
+	else:
+		init_worker(ROM_NAME)
+		for job in jobs:
+			extract_file(job)
+		ROM.close()
+
+	for name, inputs, output_name in written:
+		manifest.record(name, inputs, output_name)
+	manifest.save()
+	print("Extracted %s assets (%s unchanged) to %s" % (len(jobs), skipped, OUT_DIR))
\ No newline at end of file
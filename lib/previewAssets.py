@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+"""
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+previewAssets.py
+================
+Draws every translated string of the script assets as it would look in
+the game, using the font from the ROM, without building and booting a new
+ROM.
+
+Each PCE_english string is encoded with the translation table and the
+bytes are drawn in the dialogue boxes they open, one PNG file per string.
+Text which runs outside its box is drawn in red, and listed.
+
+John Snowdon <john@target-earth.net>
+"""
+
+import os
+import sys
+import time
+import getopt
+
+######################################################
+########## < Config starts here > ####################
+######################################################
+
+from config import ROM_NAME, FONT_ROM_ADDRESS, FONT_DOUBLE_ROM_ADDRESS
+
+from translators import get_encoder, hex_to_codes
+from Table import get_table
+from AssetContainer import read_asset, asset_files
+from Rom import Rom
+
+VERBOSE = False
+OVERWRITE = False
+# Draw the original bytes of each string from the ROM, instead of the English text
+ORIGINAL = False
+ASSETS_DIR = "assets/converted"
+OUT_DIR = "assets/preview"
+
+######################################################
+########## < Functions start here > ##################
+######################################################
+
+def encode_quietly(string, string_number):
+	"""
+	Encode a string, returning the bytes (or None if it cannot be encoded) and the encoder warnings.
+	"""
+	return get_encoder().try_encode_bytes(string = string, string_number = string_number)
+
+def preview_file(renderer, file_name, name):
+	"""
+	Draw each string of an asset file. Returns the number of strings drawn
+	and a list of (string number, problem) for those which were not drawn
+	or run outside their box.
+	"""
+	from Tiles import write_png
+	from Preview import PALETTE
+
+	asset = read_asset(file_name, raw_bytes = True)
+	drawn = 0
+	problems = []
+	for asset_chunk in asset["strings"]:
+		if ORIGINAL:
+			codes = hex_to_codes(asset_chunk["bytes"])
+			if (codes is None) or (codes == bytearray([0x00])):
+				continue
+		else:
+			if len(asset_chunk.get("PCE_english", "")) == 0:
+				continue
+			codes, warnings = encode_quietly(asset_chunk["PCE_english"], asset_chunk["string_number"])
+			if codes is None:
+				problems.append((asset_chunk["string_number"], "does not encode"))
+				continue
+		pixels, overflow = renderer.render(codes)
+		write_png(os.path.join(OUT_DIR, "%s.%s.png" % (name, asset_chunk["string_number"])), pixels, PALETTE)
+		drawn += 1
+		if overflow > 0:
+			problems.append((asset_chunk["string_number"], "%s characters outside the box" % overflow))
+	return drawn, problems
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvi:o:r:a:k:s:Jf")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
+	print("")
+	print("previewAssets.py - Draw the script assets of Cyber Knight with the game font")
+	print("----------------")
+	print("")
+
+	names = []
+	for o, a in opts:
+		if o == "-h":
+			print("A tool which draws each translated string of the script assets in the dialogue")
+			print("boxes it opens, with the font from the ROM, one PNG file per string. Text that")
+			print("runs outside its box is drawn in red.")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output")
+			print("-i	Input dir of asset files (default: %s)" % ASSETS_DIR)
+			print("-o	Output dir for the PNG files (default: %s)" % OUT_DIR)
+			print("-r	ROM file name, for the font (default: %s)" % ROM_NAME)
+			print("-a	ROM address of the 8x8 font, codes 0x20-0xFF (find it with extractAssets.py -g)")
+			print("-k	ROM address of the double height font, VRAM tiles 0x200 on")
+			print("-s	Only draw this asset (e.g. '0xa.0x1'), may be given more than once")
+			print("-J	Draw the original bytes of each string instead of the English text")
+			print("-f	Overwrite existing PNG files")
+			print("")
+			print("Example:")
+			print("previewAssets.py -a 0x3000 -s 0xa.0x1 -f")
+			print("")
+			sys.exit(0)
+
+		if o == "-v":
+			VERBOSE = True
+
+		if o == "-i":
+			ASSETS_DIR = a
+
+		if o == "-o":
+			OUT_DIR = a
+
+		if o == "-r":
+			ROM_NAME = a
+
+		if o == "-a":
+			FONT_ROM_ADDRESS = int(a, 16)
+
+		if o == "-k":
+			FONT_DOUBLE_ROM_ADDRESS = int(a, 16)
+
+		if o == "-s":
+			names.append(a)
+
+		if o == "-J":
+			ORIGINAL = True
+
+		if o == "-f":
+			OVERWRITE = True
+
+	print("Configuration")
+	print("=============")
+	print("Verbose: %s" % VERBOSE)
+	print("Over-write: %s" % OVERWRITE)
+	if os.path.isdir(ASSETS_DIR):
+		print("Assets Dir: %s <- OK" % ASSETS_DIR)
+	else:
+		print("Assets Dir: %s <- ERROR, directory not found!" % ASSETS_DIR)
+		sys.exit(2)
+	if os.path.isdir(OUT_DIR):
+		print("Output Dir: %s <- OK" % OUT_DIR)
+	else:
+		print("Output Dir: %s <- ERROR, Path does not exist" % OUT_DIR)
+		sys.exit(2)
+	if os.path.isfile(ROM_NAME):
+		print("Input ROM File: %s <- OK" % ROM_NAME)
+	else:
+		print("Input ROM File: %s <- ERROR, input file not found!" % ROM_NAME)
+		sys.exit(2)
+	if FONT_ROM_ADDRESS is None:
+		print("Font Address: <- ERROR, not known, find it with extractAssets.py -g and give it with -a")
+		sys.exit(2)
+	print("Font Address: %s" % hex(FONT_ROM_ADDRESS))
+	if FONT_DOUBLE_ROM_ADDRESS is not None:
+		print("Double Height Font Address: %s" % hex(FONT_DOUBLE_ROM_ADDRESS))
+	try:
+		from Preview import DialogueRenderer, load_font
+	except ImportError:
+		print("Preview: <- ERROR, NumPy is needed to draw the previews")
+		sys.exit(2)
+	print("")
+
+	start = time.time()
+	rom = Rom(ROM_NAME)
+	font, font_double = load_font(rom, FONT_ROM_ADDRESS, FONT_DOUBLE_ROM_ADDRESS)
+	rom.close()
+	renderer = DialogueRenderer(font, font_double, get_table())
+
+	drawn = 0
+	skipped = 0
+	all_problems = []
+	for file_name in asset_files(ASSETS_DIR):
+		name = os.path.splitext(file_name)[0]
+		if (len(names) > 0) and (name not in names):
+			continue
+		if (OVERWRITE == False) and any(f.startswith(name + ".") and f.endswith(".png") for f in os.listdir(OUT_DIR)):
+			print("Skipped %s - existing previews were found" % name)
+			skipped += 1
+			continue
+		asset_drawn, problems = preview_file(renderer, os.path.join(ASSETS_DIR, file_name), name)
+		print("%s: %s strings drawn" % (name, asset_drawn))
+		for string_number, problem in problems:
+			all_problems.append("%s.%s" % (name, string_number))
+			print("---> %s.%s: %s" % (name, string_number, problem))
+		drawn += asset_drawn
+	elapsed = time.time() - start
+
+	print("")
+	print("===============================")
+	print("Drawn: %s strings in %.1fs" % (drawn, elapsed))
+	print("Skipped: %s assets" % skipped)
+	print("Problems: %s" % len(all_problems))
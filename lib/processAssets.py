@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+"""
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+processAssets.py
+================
+Runs extractAssets.py, splitAssets.py and mapAssets.py as a single step.
+
+Each text asset is read from the ROM, split in to strings and mapped to
+the SNES script in memory, and only the mapped asset is written out. The
+translation tables and SNES script are loaded once, for every asset. The
+output is the same, byte for byte, as running the three tools in turn;
+the raw and split assets can also be written out along the way, to check
+each stage.
+
+Like mapAssets.py, this needs Python 2.
+
+John Snowdon <john@target-earth.net>
+"""
+
+import os
+import sys
+import time
+import getopt
+
+######################################################
+########## < Config starts here > ####################
+######################################################
+
+from config import ROM_NAME, PASS_NUMBER
+
+from AssetCatalog import get_catalog
+from Rom import Rom
+from Table import get_table, get_table_double, load_snes_index
+from translators import missing_stats, cache_stats
+from AssetContainer import save_asset, DAT_EXTENSION, CONTAINER_EXTENSION
+
+import extractAssets
+import splitAssets
+import mapAssets
+
+VERBOSE = False
+OVERWRITE = False
+BINARY = False
+SNES_SCRIPT = mapAssets.SNES_SCRIPT
+OUT_DIR = "assets/converted"
+# Where to also write the raw and split assets, if anywhere
+RAW_DIR = None
+SPLIT_DIR = None
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvi:s:o:p:fbR:S:")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
+	print("")
+	print("processAssets.py - Extract, split and map the script assets of Cyber Knight in one step")
+	print("----------------")
+	print("")
+
+	for o, a in opts:
+		if o == "-h":
+			print("A tool which does the work of extractAssets.py, splitAssets.py and mapAssets.py")
+			print("in one go, keeping each asset in memory between them and writing out only")
+			print("the mapped asset files.")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output")
+			print("-i	Input ROM file name (e.g. 'Cyber Knight (J).pce')")
+			print("-s	SNES script file name (e.g. 'CyberKnightSNES.csv')")
+			print("-o	Directory to write the mapped assets (e.g. 'assets/converted')")
+			print("-p	Pass number (1 == strictest matching, 3 == least strict matching)")
+			print("-f	Overwrite existing files (otherwise existing assets are skipped)")
+			print("-b	Write compact binary asset files (.cka) instead of JSON (.dat)")
+			print("-R	Also write the raw asset files, as from extractAssets.py, to this directory")
+			print("-S	Also write the split asset files, as from splitAssets.py, to this directory")
+			print("")
+			print("Example:")
+			print("processAssets.py -i 'Cyber Knight (J).pce' -o 'assets/converted' -p 1 -f")
+			print("")
+			sys.exit(0)
+
+		if o == "-v":
+			VERBOSE = True
+
+		if o == "-i":
+			ROM_NAME = a
+
+		if o == "-s":
+			SNES_SCRIPT = a
+
+		if o == "-o":
+			OUT_DIR = a
+
+		if o == "-p":
+			PASS_NUMBER = a
+
+		if o == "-f":
+			OVERWRITE = True
+
+		if o == "-b":
+			BINARY = True
+
+		if o == "-R":
+			RAW_DIR = a
+
+		if o == "-S":
+			SPLIT_DIR = a
+
+	print("Configuration")
+	print("=============")
+	print("Verbose: %s" % VERBOSE)
+	print("Over-write: %s" % OVERWRITE)
+	print("Pass Type: %s" % PASS_NUMBER)
+
+	if os.path.isfile(ROM_NAME):
+		print("Input ROM File: %s <- OK" % ROM_NAME)
+	else:
+		print("Input ROM File: %s <- ERROR, input file not found!" % ROM_NAME)
+		sys.exit(2)
+
+	if os.path.isfile(SNES_SCRIPT):
+		print("SNES Script File: %s <- OK" % SNES_SCRIPT)
+	else:
+		print("SNES Script File: %s <- ERROR, SNES script not found!" % SNES_SCRIPT)
+		sys.exit(2)
+
+	for name, directory in [("Output", OUT_DIR), ("Raw Output", RAW_DIR), ("Split Output", SPLIT_DIR)]:
+		if directory is None:
+			continue
+		if os.path.isdir(directory):
+			print("%s Directory: %s <- OK" % (name, directory))
+		else:
+			print("%s Directory: %s <- ERROR, directory not found!" % (name, directory))
+			sys.exit(2)
+	print("")
+
+	if BINARY:
+		extension = CONTAINER_EXTENSION
+	else:
+		extension = DAT_EXTENSION
+
+	# The stages print their own progress in verbose mode
+	extractAssets.VERBOSE = VERBOSE
+	splitAssets.VERBOSE = VERBOSE
+	mapAssets.VERBOSE = VERBOSE
+	mapAssets.BINARY = BINARY
+	mapAssets.set_pass_number(PASS_NUMBER)
+
+	start = time.time()
+	ttable = get_table()
+	ttable2 = get_table_double()
+	snes_index = load_snes_index(SNES_SCRIPT)
+	rom = Rom(ROM_NAME)
+
+	processed = 0
+	skipped = 0
+	for asset in get_catalog().text_assets():
+		name = hex(asset["bank"]) + "." + hex(asset["asset_index"])
+		print("=================")
+		print("Processing %s" % name)
+		if os.path.isfile(OUT_DIR + "/" + name + extension) and (OVERWRITE == False):
+			print("Skipped - an existing process file was found")
+			skipped += 1
+			continue
+
+		# extractAssets.py
+		raw = extractAssets.raw_asset(rom, asset["bank"], asset)
+		if RAW_DIR is not None:
+			save_asset(RAW_DIR + "/" + name + extension, raw)
+
+		# splitAssets.py
+		byte_sequences = splitAssets.split_strings(raw["asset_chunk"], asset["asset_rom_pointer_address"], ttable, ttable2)
+		print("Found a total of %s strings" % len(byte_sequences))
+		split = splitAssets.split_asset(raw, byte_sequences)
+		if SPLIT_DIR is not None:
+			save_asset(SPLIT_DIR + "/" + name + extension, split)
+
+		# mapAssets.py, on the strings as they are
+		split["strings"] = byte_sequences
+		patch = mapAssets.mapScript(name + extension, {"data" : split}, snes_index)
+		mapAssets.write_export(patch, name + extension, OUT_DIR)
+		processed += 1
+	rom.close()
+	elapsed = time.time() - start
+
+	print("===============================")
+	print("")
+	missing_stats()
+	cache_stats()
+	print("Processed %s assets (%s skipped) in %.1fs" % (processed, skipped, elapsed))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+"""
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+reportAssets.py
+================
+Reports how much of the script assets is translated, and shows or
+changes single strings, without loading whole asset files.
+
+Everything is read from the string index of each asset file (see
+StringIndex.py), which is built the first time it is needed and again
+whenever the asset file changes. A single string is read, or written
+back, by seeking straight to it.
+
+John Snowdon <john@target-earth.net>
+"""
+
+import os
+import sys
+import getopt
+
+######################################################
+########## < Config starts here > ####################
+######################################################
+
+from AssetContainer import asset_files, find_asset_file
+from StringIndex import asset_index, read_string, update_string, STATUS_END, STATUS_SNES, STATUS_TRANSLATED, STATUS_NOTES, STATUS_NAMES
+
+VERBOSE = False
+ASSETS_DIR = "assets/converted"
+
+# The fields of a string, in the order they are shown
+STRING_FIELDS = ["string_number", "string_size", "start_pos", "PCE_japanese", "SNES_japanese", "SNES_english", "SNES_accuracy", "PCE_english", "notes"]
+
+######################################################
+########## < Functions start here > ##################
+######################################################
+
+def status_names(status):
+	"""
+	The names of the status flags of a string, e.g. 'snes,translated'.
+	"""
+	return ",".join([name for flag, name in STATUS_NAMES if status & flag])
+
+def print_string(string):
+	"""
+	Print the fields of one string.
+	"""
+	for k in STRING_FIELDS:
+		print("%-14s %s" % (k + ":", string.get(k, u"")))
+	print("%-14s %s" % ("bytes:", " ".join(string.get("bytes", []))))
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvd:s:n:e:")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
+	print("")
+	print("reportAssets.py - Translation status of the script assets of Cyber Knight")
+	print("----------------")
+	print("")
+
+	name = None
+	string_number = None
+	english = None
+	for o, a in opts:
+		if o == "-h":
+			print("A tool which reports how many strings of each script asset are translated, and")
+			print("shows or changes the English text of a single string.")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output")
+			print("-d	Directory of script assets (default: %s)" % ASSETS_DIR)
+			print("-s	Only report on this asset (e.g. '0xc.0x9'), listing each of its strings")
+			print("-n	Show this string of the asset given with -s (e.g. 212)")
+			print("-e	Set the PCE_english text of the string given with -s and -n")
+			print("")
+			print("Example:")
+			print("reportAssets.py -s 0xc.0x9 -n 212")
+			print("")
+			sys.exit(0)
+
+		if o == "-v":
+			VERBOSE = True
+
+		if o == "-d":
+			ASSETS_DIR = a
+
+		if o == "-s":
+			name = a
+
+		if o == "-n":
+			string_number = int(a)
+
+		if o == "-e":
+			english = a
+
+	if os.path.isdir(ASSETS_DIR):
+		print("Assets Dir: %s <- OK" % ASSETS_DIR)
+	else:
+		print("Assets Dir: %s <- ERROR, directory not found!" % ASSETS_DIR)
+		sys.exit(2)
+	if (string_number is not None) and (name is None):
+		print("String: %s <- ERROR, give the asset it is in with -s" % string_number)
+		sys.exit(2)
+	if (english is not None) and (string_number is None):
+		print("English text: <- ERROR, give the string to change with -s and -n")
+		sys.exit(2)
+	file_name = None
+	if name is not None:
+		file_name = find_asset_file(ASSETS_DIR, name)
+		if file_name is None:
+			print("Asset: %s <- ERROR, no asset file found!" % name)
+			sys.exit(2)
+		print("Asset File: %s <- OK" % file_name)
+	print("")
+
+	if string_number is not None:
+		string = read_string(file_name, string_number)
+		if string is None:
+			print("String: %s.%s <- ERROR, no such string!" % (name, string_number))
+			sys.exit(2)
+		if english is not None:
+			string["PCE_english"] = english.replace("\\n", "\n")
+			try:
+				update_string(file_name, string)
+			except ValueError:
+				print("String: %s.%s <- ERROR, the text cannot be written to a JSON asset file" % (name, string_number))
+				sys.exit(2)
+			print("Updated %s.%s" % (name, string_number))
+			print("")
+		print_string(string)
+		sys.exit(0)
+
+	if file_name is not None:
+		for row in asset_index(file_name):
+			if (row[5] & STATUS_END) and not VERBOSE:
+				continue
+			print("%4s: %s %4s bytes %s" % (row[0], hex(row[3]), row[4], status_names(row[5])))
+		sys.exit(0)
+
+	print("%-12s %8s %11s %8s %8s" % ("Asset", "Strings", "Translated", "SNES", "Notes"))
+	totals = [0, 0, 0, 0]
+	for f in asset_files(ASSETS_DIR):
+		counts = [0, 0, 0, 0]
+		for row in asset_index(os.path.join(ASSETS_DIR, f)):
+			if row[5] & STATUS_END:
+				continue
+			counts[0] += 1
+			for i, flag in [(1, STATUS_TRANSLATED), (2, STATUS_SNES), (3, STATUS_NOTES)]:
+				if row[5] & flag:
+					counts[i] += 1
+		totals = [t + c for t, c in zip(totals, counts)]
+		print("%-12s %8s %11s %8s %8s" % tuple([os.path.splitext(f)[0]] + counts))
+	print("")
+	print("===============================")
+	print("Strings: %s" % totals[0])
+	if totals[0] > 0:
+		print("Translated: %s (%.1f%%)" % (totals[1], 100.0 * totals[1] / totals[0]))
+	print("SNES matched: %s" % totals[2])
+	print("With notes: %s" % totals[3])
@@ -25,25 +25,14 @@ John Snowdon <john@target-earth.net>
 """
 
 import os
-import time
-import codecs
 import sys
-import traceback
 import getopt
-import struct
-import binascii
-try:
-	import simplejson as json
-except:
-	print("Warning: Falling back to json")
-	import json
-import difflib
+import traceback
 
 try:
-	import cStringIO as StringIO
-except:
-	print("cStringIO not available")
-	import StringIO
+	from StringIO import StringIO
+except ImportError:
+	from io import StringIO
 
 ######################################################
 ########## < Config starts here > ####################
@@ -51,219 +40,334 @@ except:
 
 VERBOSE = False
 OVERWRITE = False
+BINARY = False
 INPUT_DIR = "assets/raw"
 OUT_DIR = "assets/split"
+# multiprocessing is only imported when there is more than one worker
+WORKERS = 1
 
 from CyberKnightAssetBanks import ASSETS, ASSET_LOAD_TABLE, ASSET_OFFSET_TABLE
 from CyberKnightAssetBanks import ASSET_LOAD_TABLE_SIZE, ASSET_OFFSET_TABLE_SIZE
 
-from translators import translate_string
-from Table import load_table, load_table_double
+from translators import translate_bytes, hex_to_codes, missing_stats, cache_stats
+from translators import take_missing, merge_missing
+from Table import get_table, get_table_double, table_codes, codes_hash, changed_codes
+from Manifest import Manifest, file_hash
+from AssetContainer import read_asset, save_asset, asset_files, as_text, DAT_EXTENSION, CONTAINER_EXTENSION
+from ScriptString import ScriptString
 
 ASSET_BANKS = ASSETS["asset_banks"].keys()
 
 ######################################################
-########## < Run-time code start here > ##############
+########## < Functions start here > ##################
 ######################################################
 
-try:
-	opts, args = getopt.getopt(sys.argv[1:], "hvi:t:o:f")
-except getopt.GetoptError as err:
-	print(err)
-	sys.exit(2)
+def decoded_text(string_bytes, start_pos, ttable, ttable2):
+	"""
+	The text of the bytes of a string, as it reads back from an asset file
+	(the decoder gives line breaks as \\n, the way they are written).
+	"""
+	return as_text("".join(translate_bytes(string_bytes, trans_table = ttable, trans_table_double = ttable2, start_pos = start_pos))).replace(u"\\n", u"\n")
+
+def split_strings(asset_chunk, start_pos, ttable, ttable2):
+	"""
+	Split the bytes of an asset in to strings at each 0x00 end marker,
+	decoding the text of each one. Every end marker is a string of its own.
+	Returns a list of ScriptString.
+	"""
+	# Everything before each end marker; the bytes after the last one are not a string
+	pieces = bytes(asset_chunk).split(b"\x00")[:-1]
+	string_number = 0
+	byte_sequences = []
+	pos = start_pos
+	for piece in pieces:
+		if len(piece) > 0:
+			string_number += 1
+			if VERBOSE:
+				print("%3s: %s Found a %s length byte sequence" % (string_number, hex(pos), len(piece)))
+			byte_sequences.append(ScriptString(string_number, pos, piece, decoded_text(piece, pos, ttable, ttable2)))
+			pos += len(piece)
+		
+		# The end marker
+		string_number += 1
+		if VERBOSE:
+			print("%3s: %s End marker" % (string_number, hex(pos)))
+		byte_sequences.append(ScriptString(string_number, pos, b"\x00", u"<end>"))
+		pos += 1
+	return byte_sequences
 
-print("")
-print("splitAssets.py - Asset block extractor for Cyber Knight")
-print("----------------")
-print("")
+def resplit_strings(asset_chunk, split, changed, ttable, ttable2):
+	"""
+	The strings of an asset as split_strings() would find them, given the
+	strings of an earlier split of the same asset (as read back from its
+	split asset file) and the codes that have changed in the translation
+	tables since. Only strings containing one of those codes are decoded
+	again. Returns None if the earlier split is not one of this asset.
+	"""
+	byte_sequences = []
+	joined = bytearray()
+	for s in split["strings"]:
+		try:
+			byte_sequence = ScriptString.from_asset(s)
+		except ValueError:
+			return None
+		string_bytes = bytearray(byte_sequence.bytes)
+		if (string_bytes != bytearray([0x00])) and any(code in string_bytes for code in changed):
+			if VERBOSE:
+				print("%3s: %s Decoding changed %s length byte sequence" % (byte_sequence.string_number, hex(byte_sequence.start_pos), len(string_bytes)))
+			byte_sequence.PCE_japanese = decoded_text(string_bytes, byte_sequence.start_pos, ttable, ttable2)
+		byte_sequences.append(byte_sequence)
+		joined += string_bytes
+	# Any bytes after the last end marker are not a string
+	if (asset_chunk[:len(joined)] != joined) or (0x00 in asset_chunk[len(joined):]):
+		return None
+	return byte_sequences
 
-OVERWRITE = False
-VERBOSE = False
-for o, a in opts:
-	if o == "-h":
-		print("A simple tool for splitting text asset blocks from the data files")
-		print("produced by the tool 'extractAssets.py'. Note this needs to be run for each asset chunk file.")
+def init_worker(verbose):
+	"""
+	Load the translation tables in to a worker process (if it was forked
+	after they were loaded, it already has them).
+	"""
+	global VERBOSE
+	VERBOSE = verbose
+	get_table()
+	get_table_double()
+
+def split_file(job):
+	"""
+	Split one raw asset file and write out the strings.
+
+	The job is the input file name, its path, the output path and the codes
+	changed in the translation tables since the output was last written
+	from the same file (or None to split it all again). Returns everything
+	printed along the way, and the missing translation bytes found (or None
+	if the file could not be split, for whatever reason).
+	"""
+	(input_name, input_path, output_path, changed) = job
+	stdout = sys.stdout
+	sys.stdout = StringIO()
+	try:
+		print("===============================")
 		print("")
-		print("Options:")
-		print("-h	Show help text")
-		print("-v	Enable verbose output")
-		print("-i	Input dir name (e.g. 'assets/raw')")
-		print("-o	Output dir name (e.g. 'assets/split')")
-		print("-f	Force overwite of output file even if it already exists")
+		print("Loading asset file %s" % input_name)
+		data = read_asset(input_path, raw_bytes = True)
+		data["strings"] = []
+		print("Asset Bank: %s" % data["bank"])
+		print("Asset Index: %s" % data["asset_index"])
+		print("Asset Pointer: %s" % data["asset_rom_pointer_address"])
+		print("Asset ROM Address: %s-%s" % (data["asset_rom_pointer_address"], data["asset_rom_pointer_address_limit"]))
+		print("Asset Size: %s" % data["asset_size"])
+	
+		# Rebuild the binary
 		print("")
-		print("Example:")
-		print("extractAssets.py -i 'assets/raw/0xC.0x9.dat'")
+		print("---")
 		print("")
-		sys.exit(0)
-		
-	if o == "-v":
-		VERBOSE = True
-		
-	if o == "-i":
-		INPUT_DIR = a
-		
-	if o == "-o":
-		OUT_DIR = a
-		
-	if o == "-f":
-		OVERWRITE = True
-
-print("Configuration")
-print("=============")
-print("Verbose: %s" % VERBOSE)
-print("Over-write: %s" % OVERWRITE)
-if os.path.isdir(INPUT_DIR):
-	print("Input Dir: %s <- OK" % INPUT_DIR)
-else:
-	print("Input Dir: %s <- ERROR, input dir not found!" % INPUT_DIR )
-	sys.exit(2)
+		print("Parsing text strings")
 	
-if OVERWRITE is False:
-	if os.path.isdir(OUT_DIR):
-		print("Output Dir: %s <- OK" % OUT_DIR)
-	else:
-		print("Output Dir: %s <- ERROR, Path does not exist" % OUT_DIR)
-		sys.exit(2)		
-		
-print("")
-
-#########################################################
-# This is the code that parses the binary data and splits
-# the text strings.
-#########################################################
-
-f_list = os.listdir(INPUT_DIR)
-
-for INPUT_NAME in f_list:
-	print("===============================")
-	print("")
-	print("Loading asset file %s" % INPUT_NAME)
-	file_data = open(INPUT_DIR + "/" + INPUT_NAME).read()
-	data = json.loads(file_data)
-	data["strings"] = []
-	print("Asset Bank: %s" % data["bank"])
-	print("Asset Index: %s" % data["asset_index"])
-	print("Asset Pointer: %s" % data["asset_rom_pointer_address"])
-	print("Asset ROM Address: %s-%s" % (data["asset_rom_pointer_address"], data["asset_rom_pointer_address_limit"]))
-	print("Asset Size: %s" % data["asset_size"])
+		ttable = get_table()
+		ttable2 = get_table_double()
 	
-	# Rebuild the binary
-	print("")
-	print("---")
-	print("")
-	print("Parsing text strings")
+		# The asset is only held as hex strings in the JSON file, work on the bytes
+		asset_chunk = hex_to_codes(data["asset_chunk"])
+		if asset_chunk is None:
+			print("Asset File: %s <- ERROR, asset chunk is not a list of single hex bytes" % input_name)
+			return sys.stdout.getvalue(), None
 	
-	ttable = load_table()
-	ttable2 = load_table_double()
-	string_number = 0
-	byte_sequence = {
-		"bytes" : [],
-		"text" : "",
-		"alt_text" : "",
-		"start_pos" : int(data["asset_rom_pointer_address"],16),
-		"string_number" : 0
+		take_missing()
+		byte_sequences = None
+		if changed is not None:
+			try:
+				byte_sequences = resplit_strings(asset_chunk, read_asset(output_path, raw_bytes = True), changed, ttable, ttable2)
+			except (IOError, OSError, ValueError, KeyError, TypeError):
+				byte_sequences = None
+			if byte_sequences is None:
+				print("Existing output file could not be read, splitting all strings again")
+			else:
+				print("Decoded only strings containing the %s changed table codes" % len(changed))
+		if byte_sequences is None:
+			byte_sequences = split_strings(asset_chunk, int(data["asset_rom_pointer_address"],16), ttable, ttable2)
+	
+		print("")
+		print("Found a total of %s strings" % len(byte_sequences))
+		print("")
+		print("---")
+		print("")
+		print("Writing strings to data file: %s" % output_path)
+		save_asset(output_path, split_asset(data, byte_sequences))
+		print("")
+		print("Done")
+		return sys.stdout.getvalue(), take_missing()
+	except Exception:
+		# Any one file failing must not lose what the others printed and wrote
+		print("Asset File: %s <- ERROR, could not be split" % input_name)
+		print(traceback.format_exc())
+		return sys.stdout.getvalue(), None
+	finally:
+		sys.stdout = stdout
+
+def split_asset(data, byte_sequences):
+	"""
+	The split asset file of a raw asset, the same as it reads back from the
+	file written by this tool.
+	"""
+	return {
+		"bank" : data["bank"],
+		"asset_index" : data["asset_index"],
+		"asset_rom_pointer_value" : data["asset_rom_pointer_value"],
+		"asset_rom_pointer_address" : data["asset_rom_pointer_address"],
+		"asset_rom_pointer_address_limit" : data["asset_rom_pointer_address_limit"],
+		"asset_size" : int(data["asset_rom_pointer_address_limit"], 16) - int(data["asset_rom_pointer_address"], 16),
+		"strings" : [byte_sequence.asset_string() for byte_sequence in byte_sequences],
 	}
-	byte_sequences = []
-	pos = int(data["asset_rom_pointer_address"],16)
-	for byte in data["asset_chunk"]:
-		
-		byte = byte.upper()
-		if byte != "00":
-			# Not an end marker, so add it to the string and loop again
-			byte_sequence["bytes"].append(byte)
-			pos += 1
-		else:
-			# We read a "0x00" - so this marks end of string
-			
-			# Part 1, translate the string and add it to the list
-			if len(byte_sequence["bytes"]) > 0:
-				string_number += 1
-				byte_sequence["string_number"] = string_number
-				if VERBOSE:
-					print("%3s: %s Found a %s length byte sequence" % (string_number, hex(pos - len(byte_sequence["bytes"])), len(byte_sequence["bytes"])))
-				byte_sequence = translate_string(byte_sequence = byte_sequence, trans_table = ttable, trans_table_double = ttable2, alt = False, old_assets = False, VERBOSE = VERBOSE)
-				byte_sequences.append(byte_sequence)
-			
-			# Part 2, add the end byte
-			string_number += 1
-			if VERBOSE:
-				print("%3s: %s End marker" % (string_number, hex(pos)))
-			
-			byte_sequence = {
-				"string_number" : string_number,
-				"bytes" : [byte],
-				"text" : "<end>",
-				"alt_text" : "<end>",
-				"start_pos" : pos,
-			}
-			pos += 1
-			byte_sequences.append(byte_sequence)
-			
-			# Make a new, empty data structure for the next string
-			#string_number += 1
-			byte_sequence = {
-				"string_number" : string_number,
-				"bytes" : [],
-				"text" : "",
-				"alt_text" : "",
-				"start_pos" : pos,
-			}
-				
-	print("")
-	print("Found a total of %s strings" % len(byte_sequences))
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvi:t:o:fbj:")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
 	print("")
-	print("---")
+	print("splitAssets.py - Asset block extractor for Cyber Knight")
+	print("----------------")
 	print("")
-	print("Writing strings to data file: %s" % (OUT_DIR + "/" + INPUT_NAME))
-	if OVERWRITE is False:
-		if os.path.isfile(OUT_DIR + "/" + INPUT_NAME):
-			print("Output File: %s <- ERROR, Output file already exists" % (OUT_DIR + "/" + INPUT_NAME))
-			sys.exit(2)
-			
-	file_out = open(OUT_DIR + "/" + INPUT_NAME, "w")
-	file_out.write("{\n")
-	file_out.write("	\"bank\" : \"%s\",\n" % data["bank"])
-	file_out.write("	\"asset_index\" : \"%s\",\n" % data["asset_index"])
-	file_out.write("	\"asset_rom_pointer_value\" : \"%s\",\n" % data["asset_rom_pointer_value"])
-	file_out.write("	\"asset_rom_pointer_address\" : \"%s\",\n" % data["asset_rom_pointer_address"])
-	file_out.write("	\"asset_rom_pointer_address_limit\" : \"%s\",\n" % data["asset_rom_pointer_address_limit"])
-	file_out.write("	\"asset_size\" : %s,\n" % (int(data["asset_rom_pointer_address_limit"], 16) - int(data["asset_rom_pointer_address"], 16)))
-	file_out.write("	\"strings\" : [\n")
-	for byte_sequence in byte_sequences:
-		file_out.write("		{\n")
-		file_out.write("			\"string_number\" : %s,\n" % byte_sequence["string_number"])
-		file_out.write("			\"string_size\" : %s,\n" % len(byte_sequence["bytes"]))
-		file_out.write("			\"start_pos\" : \"%s\",\n" % hex(byte_sequence["start_pos"]))
-		# Write out the raw byte sequence
-		file_out.write("			\"bytes\" : [")
-		for c in byte_sequence["bytes"]:
-			file_out.write("\"")
-			file_out.write(c.lower())
-			file_out.write("\", ")
-		file_out.seek(-2, 1)
-		file_out.write("],\n")
+
+	OVERWRITE = False
+	VERBOSE = False
+	for o, a in opts:
+		if o == "-h":
+			print("A simple tool for splitting text asset blocks from the data files")
+			print("produced by the tool 'extractAssets.py'. Note this needs to be run for each asset chunk file.")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output")
+			print("-i	Input dir name (e.g. 'assets/raw')")
+			print("-o	Output dir name (e.g. 'assets/split')")
+			print("-f	Force overwite of output files, re-splitting every asset (otherwise only assets changed since the last run are split)")
+			print("-b	Write compact binary asset files (.cka) instead of JSON (.dat)")
+			print("-j	Number of worker processes (default: %s)" % WORKERS)
+			print("")
+			print("Example:")
+			print("extractAssets.py -i 'assets/raw/0xC.0x9.dat'")
+			print("")
+			sys.exit(0)
 		
-		# Write out the first pass translation
-		file_out.write("			\"PCE_japanese\" : \"")
-		for c in byte_sequence["text"]:
-			file_out.write(c)
-		file_out.write("\",\n")
+		if o == "-v":
+			VERBOSE = True
 		
-		# Space for SNES translation
-		file_out.write("			\"SNES_japanese\" : \"\",\n")
-		file_out.write("			\"SNES_english\" : \"\",\n")
-		file_out.write("			\"SNES_accuracy\" : 0.0,\n")
+		if o == "-i":
+			INPUT_DIR = a
 		
-		# Space for English translation
-		file_out.write("			\"PCE_english\" : \"\",\n")
+		if o == "-o":
+			OUT_DIR = a
 		
-		# Notes
-		file_out.write("			\"notes\" : \"\"\n")
+		if o == "-f":
+			OVERWRITE = True
+
+		if o == "-b":
+			BINARY = True
+
+		if o == "-j":
+			WORKERS = int(a)
+
+	print("Configuration")
+	print("=============")
+	print("Verbose: %s" % VERBOSE)
+	print("Over-write: %s" % OVERWRITE)
+	print("Workers: %s" % WORKERS)
+	if os.path.isdir(INPUT_DIR):
+		print("Input Dir: %s <- OK" % INPUT_DIR)
+	else:
+		print("Input Dir: %s <- ERROR, input dir not found!" % INPUT_DIR )
+		sys.exit(2)
+	
+	if OVERWRITE is False:
+		if os.path.isdir(OUT_DIR):
+			print("Output Dir: %s <- OK" % OUT_DIR)
+		else:
+			print("Output Dir: %s <- ERROR, Path does not exist" % OUT_DIR)
+			sys.exit(2)		
 		
-		file_out.write("		},\n")
-	file_out.seek(-2, 1)
-	file_out.write("\n	]\n")
-	file_out.write("}")
-	file_out.close()
 	print("")
-	print("Done")
\ No newline at end of file
+
+	#########################################################
+	# This is the code that parses the binary data and splits
+	# the text strings.
+	#########################################################
+
+	# Load the tables before any workers start, so that they are shared with them
+	ttable = get_table()
+	ttable2 = get_table_double()
+	codes = table_codes(ttable, ttable2)
+	tables_hash = codes_hash(codes)
+
+	# The manifest of what each asset already in the output dir was split from
+	manifest = Manifest(OUT_DIR)
+	f_list = asset_files(INPUT_DIR)
+	jobs = []
+	written = []
+	skipped = 0
+	for INPUT_NAME in f_list:
+		name = os.path.splitext(INPUT_NAME)[0]
+		if BINARY:
+			OUTPUT_NAME = name + CONTAINER_EXTENSION
+		else:
+			OUTPUT_NAME = name + DAT_EXTENSION
+		inputs = {"raw" : file_hash(INPUT_DIR + "/" + INPUT_NAME), "tables" : tables_hash}
+		changed = None
+		if OVERWRITE is False:
+			# Only split assets whose raw file or translation tables have changed
+			# since they were last split, and never overwrite a file that was not
+			# split by this tool or has been edited since
+			if manifest.unchanged(name, inputs, OUTPUT_NAME):
+				print("Output File: %s <- unchanged, skipped" % (OUT_DIR + "/" + OUTPUT_NAME))
+				skipped += 1
+				continue
+			if os.path.isfile(OUT_DIR + "/" + OUTPUT_NAME):
+				if not manifest.written(name, OUTPUT_NAME):
+					print("Output File: %s <- ERROR, Output file already exists" % (OUT_DIR + "/" + OUTPUT_NAME))
+					sys.exit(2)
+				# If only the tables have changed, only the strings with the changed codes need decoding again
+				last_inputs = manifest.inputs(name)
+				if (last_inputs["raw"] == inputs["raw"]) and (last_inputs["tables"] in manifest.tables):
+					changed = changed_codes(manifest.tables[last_inputs["tables"]], codes)
+		jobs.append((INPUT_NAME, INPUT_DIR + "/" + INPUT_NAME, OUT_DIR + "/" + OUTPUT_NAME, changed))
+		written.append((name, inputs, OUTPUT_NAME))
+	manifest.tables[tables_hash] = codes
+	if WORKERS > 1:
+		import multiprocessing
+		pool = multiprocessing.Pool(WORKERS, initializer = init_worker, initargs = (VERBOSE,))
+		results = pool.map(split_file, jobs)
+		pool.close()
+		pool.join()
+	else:
+		init_worker(VERBOSE)
+		results = [split_file(job) for job in jobs]
+
+	# Everything is printed in file order, however many workers there are, and
+	# every file that was split is recorded, even if another one failed
+	failed = []
+	for (output, missing_bytes), (name, inputs, output_name) in zip(results, written):
+		sys.stdout.write(output)
+		if missing_bytes is None:
+			failed.append(name)
+			continue
+		merge_missing(missing_bytes)
+		manifest.record(name, inputs, output_name)
+	manifest.save()
+	if len(failed) > 0:
+		print("===============================")
+		print("")
+		print("Split: %s <- ERROR, %s of %s assets could not be split" % (", ".join(failed), len(failed), len(jobs)))
+		sys.exit(2)
+
+	print("===============================")
+	print("")
+	missing_stats()
+	cache_stats()
+	print("Split %s assets (%s unchanged) to %s" % (len(jobs), skipped, OUT_DIR))
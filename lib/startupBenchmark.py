@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+"""
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+startupBenchmark.py
+================
+Times how long each of the asset tools takes to start up, by running their
+quick modes (-h, and the -S summary of mapAssets.py) a number of times.
+
+The time of an empty interpreter is shown as well, as that is as fast as any
+of the tools can possibly start.
+
+John Snowdon <john@target-earth.net>
+"""
+
+import os
+import sys
+import time
+import getopt
+import subprocess
+
+######################################################
+########## < Config starts here > ####################
+######################################################
+
+RUNS = 10
+PYTHON = sys.executable
+LIB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Anything slower than this (in milliseconds, over an empty interpreter) is flagged
+LIMIT = 100
+
+# Tool and arguments of each quick mode to time
+TOOLS = [
+	("extractAssets.py", ["-h"]),
+	("splitAssets.py", ["-h"]),
+	("mapAssets.py", ["-h"]),
+	("mapAssets.py", ["-S"]),
+	("expandRom.py", ["-h"]),
+	("verifyAssets.py", ["-h"]),
+]
+
+######################################################
+########## < Functions start here > ##################
+######################################################
+
+def time_command(command, runs):
+	"""
+	Run a command a number of times, returning the time of each run in milliseconds
+	and the exit code of the last one.
+	"""
+	times = []
+	exit_code = 0
+	devnull = open(os.devnull, "w")
+	for i in range(0, runs):
+		start = time.time()
+		exit_code = subprocess.call(command, stdout = devnull, stderr = devnull)
+		times.append((time.time() - start) * 1000.0)
+	devnull.close()
+	return times, exit_code
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hn:p:l:")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
+	print("")
+	print("startupBenchmark.py - Start up times of the Cyber Knight asset tools")
+	print("----------------")
+	print("")
+
+	for o, a in opts:
+		if o == "-h":
+			print("A tool which times the quick (-h, -S) modes of each of the asset tools.")
+			print("Run it from the same directory as you would run the tools.")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-n   Number of runs of each tool (default: %s)" % RUNS)
+			print("-p   Python interpreter to run the tools with (default: %s)" % PYTHON)
+			print("-l   Limit in milliseconds over an empty interpreter (default: %s)" % LIMIT)
+			print("")
+			print("Example:")
+			print("startupBenchmark.py -n 20 -p python2")
+			print("")
+			sys.exit(0)
+
+		if o == "-n":
+			RUNS = int(a)
+
+		if o == "-p":
+			PYTHON = a
+
+		if o == "-l":
+			LIMIT = float(a)
+
+	print("Interpreter: %s" % PYTHON)
+	print("Runs: %s" % RUNS)
+	print("")
+
+	# Warm up the interpreter and any .pyc files before timing anything
+	for tool, tool_args in TOOLS:
+		time_command([PYTHON, os.path.join(LIB_DIR, tool)] + tool_args, 1)
+
+	empty_times, exit_code = time_command([PYTHON, "-c", "pass"], RUNS)
+	empty = min(empty_times)
+
+	slow = 0
+	print("| %-24s | %8s | %8s | %8s | %s" % ("Tool", "Best ms", "Mean ms", "Over ms", "Status"))
+	print("|--------------------------|----------|----------|----------|-------")
+	print("| %-24s | %8.1f | %8.1f | %8s | %s" % ("(empty interpreter)", empty, sum(empty_times) / len(empty_times), "-", "-"))
+	for tool, tool_args in TOOLS:
+		times, exit_code = time_command([PYTHON, os.path.join(LIB_DIR, tool)] + tool_args, RUNS)
+		best = min(times)
+		if exit_code != 0:
+			# e.g. mapAssets.py, which only runs on Python 2
+			status = "FAILED (exit code %s)" % exit_code
+		elif (best - empty) > LIMIT:
+			status = "SLOW"
+			slow += 1
+		else:
+			status = "OK"
+		print("| %-24s | %8.1f | %8.1f | %8.1f | %s" % (tool + " " + " ".join(tool_args), best, sum(times) / len(times), best - empty, status))
+
+	print("")
+	if slow > 0:
+		print("%s tool(s) took more than %sms to start" % (slow, LIMIT))
+		sys.exit(1)
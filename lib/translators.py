@@ -25,14 +25,10 @@ and a complete translation table (distributed with this programe).
 John Snowdon <john@target-earth.net>
 """
 
-import os
-import codecs
 import sys
-import traceback
-import getopt
-import struct
 import binascii
-import json
+from array import array
+from collections import OrderedDict
 
 ######################################################
 ############ < User configuration > ##################
@@ -42,11 +38,11 @@ import json
 MISSING_BYTES = {}
 
 # Translation table loader
-from Table import load_table, load_table_double
+from Table import get_table, get_table_double, compiled_table
 
 # Default values
 from config import ROM_NAME, TABLE_NAME, TABLE_NAME_DOUBLE, OUT_NAME
-from config import OVERWRITE, VERBOSE
+from config import OVERWRITE, VERBOSE, CODEC_CACHE_SIZE
 from config import SWITCH_MODE, KANJI_CODE
 from config import DAKUTEN_ALL, DAKUTEN, DAKUTEN_REPLACE, PC_NAME, PC_NAMES
 from config import DIALOGUE_BOX, DIALOGUE_CODES
@@ -61,178 +57,665 @@ from config import METHOD_1_TRAILING_BYTES, METHOD_2_TRAILING_BYTES, METHOD_3_TR
 ############ < Code starts here > ####################
 ######################################################
 
-def encode_text(string, trans_table, string_number = 0):
+class LRUCache(object):
 	"""
-	Encode a string using the translation table to set the hex equivalent of the given characters.
+	A dictionary of at most capacity items, dropping the least recently used
+	item when a new one is added to a full cache.
+	
+	Counts the hits and misses of get(), so that the caches in front of the
+	encoder and decoder can be reported on.
 	"""
-	VERBOSE = 0
-	ttable = trans_table
-	encoded_as_hex = []
-	pos = 0
-	errors = False
-	i = 0
-	if VERBOSE:
-		print("Encoding %s characters" % len(string))
-	while i < len(string):
+	
+	def __init__(self, capacity = CODEC_CACHE_SIZE):
+		self.capacity = capacity
+		self.items = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+	
+	def get(self, key, default = None):
+		"""
+		Return the item for key, making it the most recently used, or default if there isn't one.
+		"""
+		try:
+			value = self.items.pop(key)
+		except KeyError:
+			self.misses += 1
+			return default
+		self.items[key] = value
+		self.hits += 1
+		return value
+	
+	def put(self, key, value):
+		"""
+		Add an item, dropping the least recently used item if the cache is full.
+		"""
+		if self.capacity <= 0:
+			return
+		if key in self.items:
+			del self.items[key]
+		elif len(self.items) >= self.capacity:
+			self.items.popitem(last = False)
+		self.items[key] = value
+	
+	def clear(self):
+		"""
+		Empty the cache and reset the counters.
+		"""
+		self.items.clear()
+		self.hits = 0
+		self.misses = 0
+	
+	def __len__(self):
+		return len(self.items)
+	
+	def __contains__(self, key):
+		return key in self.items
+	
+	def stats(self):
+		"""
+		Return a one line summary of the cache use.
+		"""
+		lookups = self.hits + self.misses
+		if lookups > 0:
+			rate = 100.0 * self.hits / lookups
+		else:
+			rate = 0.0
+		return "%s hits, %s misses (%.1f%%), %s of %s entries used" % (self.hits, self.misses, rate, len(self.items), self.capacity)
+
+class TextEncoder(object):
+	"""
+	A compiled version of encode_text for one translation table.
+	
+	Instead of walking every row of the translation table for every character,
+	a reverse index of glyph, control code name and raw hex code to byte code is
+	built once, and kept in the table cache for next time. Where more than one
+	row would match the same text, the row that the table search would have
+	found first is kept, so the encoded bytes are the same as the table search
+	produces.
+	"""
+	
+	def __init__(self, trans_table, cache_size = CODEC_CACHE_SIZE):
+		self.trans_table = trans_table
+		# Encoded strings, by (output type, text)
+		self.cache = LRUCache(cache_size)
+		# Glyphs, control code names and hex codes (the first table search),
+		# raw byte codes (the second table search) and the control code trie
+		self.index, self.raw_index, self.trie = compiled_table("encoder", trans_table, lambda: compile_encoder_index(trans_table))
+		self.newline = ("02".lower().encode('utf8'), _hex_bytes("02"))
+	
+	def tokenize(self, string):
+		"""
+		Split a string into a list of (token, is_control_code) pairs.
 		
-		s = string[i]
-		s_found = False
-		s_code = False
-		s_byte = False
-		# is this a left chevron?
-		#print("%s: %s" % (i, s))
-
-		if (s == "<"):
-			if VERBOSE:
-				print("Possible control byte")
-			# yes - this might be a control byte or lookup
-			s_byte = s
-			# is there a matching right chevron?
-			for extra_char in string[i + 1:len(string)]:
-				s_byte += extra_char
-				#print s_byte
-				# A right chevron, so whatever is between the two is a control code
-				if extra_char == ">":
-					s_code = True
-					break
-				# Another left chevron, so this must be a literal left chevron
-				if extra_char == "<":
-					s_code = False
-					break
-			if s_code:
-				if VERBOSE:
-					print("INFO: Got a control byte: %s" % s_byte)
-				# jump to the end pos within input string
-				s_code = True
-				i = i + len(s_byte) - 1
-				
-		#print(s.encode('utf-8')
-		#sys.stdout.write(s.encode('utf-8'))
-		#sys.stdout.flush()
-		if (s == "\n"):
-			hex_byte = "02"
-			encoded_as_hex.append(hex_byte.lower().encode('utf8'))
-			s_found = True
-			i += 1
+		A left chevron starts a control code token if a right chevron follows it
+		before any other left chevron, otherwise it is a literal left chevron.
+		Known control codes are matched from the trie, anything else in chevrons
+		(such as a raw byte code like <1a>) is still returned as a single token.
+		"""
+		tokens = []
+		length = len(string)
+		i = 0
+		while i < length:
+			s = string[i]
+			end = None
+			if (s == "<"):
+				node = self.trie
+				j = i + 1
+				# Follow the longest control code in the table
+				while (j < length) and (string[j] in node):
+					node = node[string[j]]
+					j += 1
+					if TRIE_END in node:
+						end = j
+				if end is None:
+					# Control codes hold no chevrons, so carry on from where the
+					# trie stopped to look for the right chevron
+					while (j < length) and (string[j] != "<") and (string[j] != ">"):
+						j += 1
+					if (j < length) and (string[j] == ">"):
+						end = j + 1
+			if end is None:
+				tokens.append((s, False))
+				i += 1
+			else:
+				tokens.append((string[i:end], True))
+				i = end
+		return tokens
+	
+	def encode(self, string, string_number = 0):
+		"""
+		Encode a string, returning the list of hex codes for its characters.
+		"""
+		return self._encode(string, string_number, as_bytes = False)
+	
+	def encode_bytes(self, string, string_number = 0):
+		"""
+		Encode a string, returning a bytearray of its encoded bytes.
+		"""
+		return self._encode(string, string_number, as_bytes = True)
+	
+	def try_encode_bytes(self, string, string_number = 0):
+		"""
+		Encode a string, returning a bytearray of its encoded bytes (or None if
+		it cannot be encoded) and a list of the warnings for it, rather than
+		printing the warnings and exiting.
+		"""
+		warnings = []
+		return self._encode(string, string_number, as_bytes = True, warnings = warnings), warnings
+	
+	def encode_many(self, strings, string_numbers = None):
+		"""
+		Encode a list of strings in to one packed buffer.
+		
+		Returns the bytearray along with array('I')s of the start offset and length
+		of each string within it. Entries that are already a bytearray or memoryview
+		(such as the original bytes of an untranslated string) are copied in as is.
+		"""
+		packed = bytearray()
+		offsets = array('I')
+		lengths = array('I')
+		for i in range(0, len(strings)):
+			offsets.append(len(packed))
+			if isinstance(strings[i], (bytearray, memoryview)):
+				packed += strings[i]
+			elif string_numbers is None:
+				packed += self._encode(strings[i], i, as_bytes = True)
+			else:
+				packed += self._encode(strings[i], string_numbers[i], as_bytes = True)
+			lengths.append(len(packed) - offsets[i])
+		return packed, offsets, lengths
+	
+	def _encode(self, string, string_number, as_bytes, warnings = None):
+		"""
+		Encode a string either as a list of hex codes or as a bytearray.
+		
+		Strings which encode without errors are cached, and a copy of the cached
+		result is returned when the same string is seen again. See
+		_encode_uncached for strings which do not encode.
+		"""
+		key = (as_bytes, string)
+		encoded = self.cache.get(key)
+		if encoded is None:
+			encoded = self._encode_uncached(string, string_number, as_bytes, warnings)
+			if encoded is None:
+				return None
+			if as_bytes:
+				self.cache.put(key, bytes(encoded))
+			else:
+				self.cache.put(key, tuple(encoded))
+			return encoded
+		if as_bytes:
+			return bytearray(encoded)
+		return list(encoded)
+	
+	def _encode_uncached(self, string, string_number, as_bytes, warnings = None):
+		"""
+		Encode a string either as a list of hex codes or as a bytearray, without the cache.
+		
+		If the string does not encode, the warnings are printed and the program
+		exits, unless a warnings list is given, in which case the warnings are
+		added to it and None is returned.
+		"""
+		if as_bytes:
+			encoded_as_hex = bytearray()
+			add = encoded_as_hex.extend
+			output = 1
 		else:
+			encoded_as_hex = []
+			add = encoded_as_hex.append
+			output = 0
+		errors = []
+		i = 0
+		for s_byte, s_code in self.tokenize(string):
+			
 			if s_code:
-				match_s = str(s_byte)  # e.g. <end> or <34>
+				# Index of the right chevron
+				i = i + len(s_byte) - 1
+				match_s = s_byte # e.g. <end> or <34>
 				match_s_raw = s_byte[1:-1].upper() # e.g. 34
-				# control codes can be uppercase
+			elif (s_byte == "\n"):
+				add(self.newline[output])
+				i += 1
+				continue
 			else:
-				match_s = s
-				match_s_raw = s
-				# normal text is case sensitive
-
-			# Search for the matching hex code for this character to encode it
+				match_s = s_byte
+				match_s_raw = s_byte
 			
-			#print("%s, %s" % (match_s, match_s_raw))
+			hex_byte = self.index.get(match_s)
+			if hex_byte is None:
+				hex_byte = self.raw_index.get(match_s_raw)
 			
-			s_found = False
-			for hex_byte in ttable.keys():					
-				if (match_s == ttable[hex_byte]["pre_shift"]) or (match_s.encode('utf8') == ttable[hex_byte]["post_shift"]) or (match_s.encode('utf8') == hex_byte):
-					encoded_as_hex.append(hex_byte.lower().encode('utf8'))
-					s_found = True
-					i += 1
-					if VERBOSE:
-						print("Found control code for byte [%s] at string %s, index %s for %s" % (hex_byte.lower(), string_number, i, match_s))
-					break
-			# Search for a match in column 1 of the table, ie the actual byte code
-			if s_found is False:
-				for hex_byte in ttable.keys():	
-					#print("finding [%s]" % match_s_raw.lower().encode('utf8'))
-					if (match_s_raw.encode('utf8') == ttable[hex_byte]["byte_code"]):
-						encoded_as_hex.append(hex_byte.lower().encode('utf8'))
-						s_found = True
-						i += 1
-						if VERBOSE:
-							print("Found raw byte code for [%s] at string %s, index %s for %s" % (hex_byte.lower(), string_number, i, match_s_raw))
-						break
-
-			# If we didn't find a control code lookup then just add the literal
-			if ((s_found is False) and (s_code is True)) and (len(s_byte) == 4):
-				if VERBOSE:
-					print("WARNING!(a) No lookup for control byte [%s] at string %s, index %s - adding %s" % (s_byte, string_number, i, s_byte[1:-1]))
-				encoded_as_hex.append(s_byte[1:-1].lower().encode('utf8'))
-				s_found = True
-				i += 1
-				
-			# If we didn't find a character lookup, then... erm... I don't know!
-			if s_found is False:
+			if (hex_byte is None) and s_code and (len(s_byte) == 4):
+				# If we didn't find a control code lookup then just add the literal
+				hex_byte = (s_byte[1:-1].lower().encode('utf8'), _hex_bytes(s_byte[1:-1]))
+			
+			if (hex_byte is not None) and (hex_byte[output] is not None):
+				add(hex_byte[output])
+			else:
+				# If we didn't find a character lookup, then... erm... I don't know!
 				if s_code:
-					print("WARNING!(b) No lookup for [%s] at string %s, index %s" % (s_byte, string_number, i))
+					errors.append("WARNING!(b) No lookup for [%s] at string %s, index %s" % (s_byte, string_number, i))
 				else:
-					print("WARNING!(c) No lookup for [%s] at string %s, index %s" % (s, string_number, i))
-				print("Full string is: %s" % string.encode('utf8'))
-				print("")
-				i += 1
-				errors = True
-		pos += 1
+					errors.append("WARNING!(c) No lookup for [%s] at string %s, index %s" % (s_byte, string_number, i))
+				errors.append("Full string is: %s" % string.encode('utf8'))
+				errors.append("")
+			i += 1
 		
-	if VERBOSE:
-		print("Encoded as %s bytes" % len(encoded_as_hex))
-	if errors:
-		print("Errors encountered. Encoded bytes: %s" % encoded_as_hex)
-		sys.exit(1)
-	return encoded_as_hex
+		if errors:
+			errors.append("Errors encountered. Encoded bytes: %s" % encoded_as_hex)
+			if warnings is not None:
+				warnings.extend(errors)
+				return None
+			for line in errors:
+				print(line)
+			sys.exit(1)
+		return encoded_as_hex
 
-def translate_double_string(bytes, trans_table_double, alt=False):
+def compile_encoder_index(trans_table):
 	"""
-	translate_double_string - construct the actual text, using multi-byte, double height (aka Kanji ideograms)
-	where appropriate.
+	Build the reverse indexes used by TextEncoder, returning (index, raw_index, trie).
+	
+	index maps glyphs, control code names and hex codes to their byte code, and
+	raw_index maps raw byte codes (e.g. the "1A" of <1a>), both as (hex code,
+	raw bytes) pairs for the two kinds of output. trie holds every multi-character
+	control code, used to split a string into characters and <...> tokens in a
+	single pass.
 	"""
+	index = {}
+	raw_index = {}
+	for hex_byte in trans_table.keys():
+		encoded = (hex_byte.lower().encode('utf8'), _hex_bytes(hex_byte))
+		for key in (_text_key(trans_table[hex_byte]["pre_shift"]), _utf8_key(trans_table[hex_byte]["post_shift"]), _utf8_key(hex_byte)):
+			if (key is not None) and (key not in index):
+				index[key] = encoded
+		key = _utf8_key(trans_table[hex_byte]["byte_code"])
+		if (key is not None) and (key not in raw_index):
+			raw_index[key] = encoded
+	
+	trie = {}
+	for hex_byte in trans_table.keys():
+		for name in (_text_key(trans_table[hex_byte]["pre_shift"]), _text_key(trans_table[hex_byte]["post_shift"])):
+			if _is_control_name(name):
+				node = trie
+				# Tokens are only ever started at a left chevron, so skip it
+				for c in name[1:]:
+					node = node.setdefault(c, {})
+				node[TRIE_END] = True
+	return index, raw_index, trie
 
-	new_bytes = []
-	# Can only work with even string lengths
-	if (len(bytes)%2==0):
-		if VERBOSE:
-			print("")
-		check_bytes = []
-		b_pos_start = 0
-		b_pos_end = 2
-		while b_pos_end <= len(bytes):
-			b = ""
-			b_range = bytes[b_pos_start:b_pos_end]
+def _is_control_name(name):
+	"""
+	Is a translation table value a multi-character control code name, e.g. <NPC_Mica>?
+	"""
+	if (name is None) or (len(name) < 3):
+		return False
+	if (name[0] != "<") or (name[-1] != ">"):
+		return False
+	# Anything with chevrons inside could never be matched as a single token
+	return ("<" not in name[1:-1]) and (">" not in name[1:-1])
 
-			for ch in b_range:
+def _hex_bytes(hex_byte):
+	"""
+	Return the bytes for a hex code such as "1A" or "1A4F", or None if it is not valid hex.
+	"""
+	try:
+		return bytes(bytearray.fromhex(hex_byte))
+	except (TypeError, ValueError):
+		return None
 
-				#b += str(binascii.hexlify(ch))
-				b += str(ch)
-			if VERBOSE:
-				print("Searching for <%s>" % str(b.upper()))
-			# Double height strings are only ever an even number
-			if (b.upper() in trans_table_double.keys()):
-				
-				bt = trans_table_double[b.upper()]["pre_shift"]
-				if VERBOSE:
-					print("Found %s" % bt)
-				new_bytes.append("%s" % bt)
-				b_pos_start = b_pos_end
-				b_pos_end = b_pos_start + 2
+def _text_key(value):
+	"""
+	Return the text which compares equal to a translation table value, or None.
+	"""
+	if isinstance(value, bytes):
+		# Python 2 - the table holds byte strings, which only compare equal to ASCII text
+		try:
+			return value.decode('ascii')
+		except UnicodeDecodeError:
+			return None
+	return value
+
+def _utf8_key(value):
+	"""
+	Return the text whose UTF-8 encoding compares equal to a translation table value, or None.
+	"""
+	if isinstance(value, bytes):
+		try:
+			return value.decode('utf8')
+		except UnicodeDecodeError:
+			return None
+	# Python 3 - encoded text never compares equal to a str
+	return None
+
+# Marks the end of a control code in the TextEncoder trie
+TRIE_END = None
+
+# The encoder for the most recently used translation table
+ENCODER = None
+
+def get_encoder(trans_table = None):
+	"""
+	Return a compiled encoder for the translation table, reusing the last one if the table is the same.
+	
+	With no translation table, the one shared by the whole process is used.
+	"""
+	global ENCODER
+	if trans_table is None:
+		trans_table = get_table()
+	if (ENCODER is None) or ((ENCODER.trans_table is not trans_table) and (ENCODER.trans_table != trans_table)):
+		ENCODER = TextEncoder(trans_table)
+	return ENCODER
+
+def encode_text(string, trans_table = None, string_number = 0):
+	"""
+	Encode a string using the translation table to set the hex equivalent of the given characters.
+	"""
+	return get_encoder(trans_table).encode(string, string_number)
+
+def encode_bytes(string, trans_table = None, string_number = 0):
+	"""
+	Encode a string using the translation table, returning a bytearray rather than a list of hex codes.
+	"""
+	return get_encoder(trans_table).encode_bytes(string, string_number)
+
+def encode_many(strings, trans_table = None, string_numbers = None):
+	"""
+	Encode a list of strings in to one bytearray, returning it with array('I')s of each string's offset and length.
+	"""
+	return get_encoder(trans_table).encode_many(strings, string_numbers)
+
+class TextDecoder(object):
+	"""
+	A compiled version of translate_string for one pair of translation tables.
+	
+	Every byte is decoded with a lookup in a 256 entry dispatch table, one for
+	text before a SWITCH_MODE byte and one for text after it. The two byte codes
+	(dakuten composites, PC_NAME and DIALOGUE_BOX codes) have a second level
+	table indexed by the first byte and then the second, so no hex strings are
+	built or searched for while decoding. The decoded text is the same as the
+	table search in translate_string produces.
+	"""
+	
+	def __init__(self, trans_table, trans_table_double, cache_size = CODEC_CACHE_SIZE):
+		self.trans_table = trans_table
+		self.trans_table_double = trans_table_double
+		# Decoded strings, by their bytes (and how an unknown final byte is shown)
+		self.cache = LRUCache(cache_size)
+		self.double_table = get_double_table(trans_table_double)
+		self.kanji_code = int(KANJI_CODE, 16)
+		self.kanji_code_byte = _hex_bytes(KANJI_CODE)
+		
+		# Text for single bytes in pre-shift (0) and post-shift (1) mode, where
+		# None marks the SWITCH_MODE byte that toggles between the two.
+		self.single = ([None] * 256, [None] * 256)
+		# Text for the final byte of a string, which is always pre-shift
+		self.final = [None] * 256
+		for code in range(0, 256):
+			b = "%02X" % code
+			if b in trans_table:
+				self.final[code] = trans_table[b]["pre_shift"]
+				if b != SWITCH_MODE:
+					self.single[0][code] = trans_table[b]["pre_shift"]
+					self.single[1][code] = trans_table[b]["post_shift"]
 			else:
-				#print "Not Found"
-				# warning - byte sequence not in table
-				b_pos_end += 2
-				b_range = bytes[b_pos_start:b_pos_end]
-				if b_pos_end > len(bytes):
-					for ch in b_range:
-						new_bytes.append("<" + str(binascii.hexlify(ch)) + ">")
-		if len(new_bytes) == 0:
-			new_bytes = bytes
-		if VERBOSE:
-			print("End <%s>" % new_bytes)
-		return new_bytes
-	else:
+				self.final[code] = "<%s>" % b
+				if b != SWITCH_MODE:
+					self.single[0][code] = "<%s>" % b
+					self.single[1][code] = "<%s>" % b
+		
+		# (pre-shift, post-shift) text for two byte codes, by first byte then second byte
+		self.pairs = []
+		for first in range(0, 256):
+			seconds = [int(b, 16) for b in DAKUTEN]
+			if "%02X" % first == PC_NAME:
+				seconds += [int(b, 16) for b in PC_NAMES]
+			if "%02X" % first == DIALOGUE_BOX:
+				seconds += [int(b, 16) for b in DIALOGUE_CODES]
+			row = [None] * 256
+			for second in seconds:
+				b = "%02X%02X" % (first, second)
+				if b in trans_table:
+					row[second] = (trans_table[b]["pre_shift"], trans_table[b]["post_shift"])
+				else:
+					row[second] = ("<%s>" % b, "<%s>" % b)
+			self.pairs.append(row)
+	
+	def decode(self, codes, hex_codes = None, start_pos = 0):
+		"""
+		Decode a sequence of byte values, returning the list of decoded characters.
+		
+		hex_codes is the list of hex strings the byte values came from, if any, so
+		that an unknown final byte is shown as written. start_pos is the ROM
+		address of the first byte, used when reporting unknown double height codes.
+		
+		Strings without double height characters are cached. Those with them are
+		always decoded, so that unknown codes are recorded at each position they
+		are found.
+		"""
+		key = bytes(codes) if isinstance(codes, bytearray) else bytes(bytearray(codes))
+		if self.kanji_code_byte in key:
+			return self._decode(codes, hex_codes, start_pos)
+		if (hex_codes is not None) and (len(hex_codes) > 0):
+			key = (key, hex_codes[-1])
+		text = self.cache.get(key)
+		if text is None:
+			text = self._decode(codes, hex_codes, start_pos)
+			self.cache.put(key, tuple(text))
+			return text
+		return list(text)
+	
+	def _decode(self, codes, hex_codes = None, start_pos = 0):
+		"""
+		Decode a sequence of byte values, without the cache.
+		"""
+		text = []
+		n = len(codes)
+		if n < 2:
+			return text
+		single = self.single
+		pairs = self.pairs
+		mode = 0
+		already_i = 0
+		# Each step decodes the byte before i, so that i can tell us if it is the
+		# first of a two byte code
+		i = 1
+		while i < n:
+			b1 = codes[i - 1]
+			b2 = codes[i]
+			pair = pairs[b1][b2]
+			if pair is not None:
+				text.append(pair[mode])
+				already_i = i + 1
+			elif b1 == self.kanji_code:
+				text.append("<kanji>")
+				# b2 is the number of double height bytes to follow
+				if (n - i - 1) >= b2:
+					already_i += b2 + 1
+					text.extend(translate_double_codes(codes[i + 1:i + 1 + b2], self.double_table, start_pos + i + 1))
+				else:
+					# Not enough bytes left, so it is just a kanji code byte
+					text.append(single[mode][b1])
+			else:
+				t = single[mode][b1]
+				if t is None:
+					mode = 1 - mode
+				else:
+					text.append(t)
+			i = max(i + 1, already_i + 1)
+		
+		# The last byte is always decoded on its own
+		b = codes[n - 1]
+		if (hex_codes is not None) and ("%02X" % b not in self.trans_table):
+			text.append("<%s>" % hex_codes[n - 1])
+		else:
+			text.append(self.final[b])
+		return text
+
+def translate_bytes(data, trans_table = None, trans_table_double = None, start_pos = 0):
+	"""
+	Decode the bytes of an asset string (bytes, bytearray or memoryview), returning the list of decoded characters.
+	"""
+	return get_decoder(trans_table, trans_table_double).decode(as_codes(data), start_pos = start_pos)
+
+def as_codes(data):
+	"""
+	Return something that indexes as byte values for bytes, a bytearray or a memoryview, without copying where possible.
+	"""
+	if isinstance(data, bytearray):
+		return data
+	if (bytes is not str) and isinstance(data, (bytes, memoryview)):
+		# Python 3 - these already index as integers
+		return data
+	return bytearray(data)
+
+def codes_to_hex(data):
+	"""
+	Turn bytes in to the list of two character, lower case hex strings used in the asset files.
+	"""
+	return ["%02x" % b for b in as_codes(data)]
+
+def hex_to_codes(hex_codes):
+	"""
+	Turn a list of two character hex strings in to a bytearray, or None if they are not all single bytes.
+	Bytes read from a binary asset container are already a bytearray, and are returned as they are.
+	"""
+	if isinstance(hex_codes, bytearray):
+		return hex_codes
+	for b in hex_codes:
+		if len(b) != 2:
+			return None
+	try:
+		codes = bytearray.fromhex("".join(hex_codes))
+	except (TypeError, ValueError):
+		return None
+	if len(codes) != len(hex_codes):
+		return None
+	return codes
+
+# The decoder for the most recently used pair of translation tables
+DECODER = None
+
+def get_decoder(trans_table = None, trans_table_double = None):
+	"""
+	Return a compiled decoder for the translation tables, reusing the last one if the tables are the same.
+	
+	With no translation tables, the ones shared by the whole process are used.
+	"""
+	global DECODER
+	if trans_table is None:
+		trans_table = get_table()
+	if trans_table_double is None:
+		trans_table_double = get_table_double()
+	if (DECODER is None) or ((DECODER.trans_table is not trans_table) and (DECODER.trans_table != trans_table)) or ((DECODER.trans_table_double is not trans_table_double) and (DECODER.trans_table_double != trans_table_double)):
+		DECODER = TextDecoder(trans_table, trans_table_double)
+	return DECODER
+
+def cache_stats():
+	"""
+	Print how well the encoder and decoder caches are being used.
+	"""
+	if ENCODER is not None:
+		print("Encoder cache: %s" % ENCODER.cache.stats())
+	if DECODER is not None:
+		print("Decoder cache: %s" % DECODER.cache.stats())
+
+def compile_double_table(trans_table_double):
+	"""
+	Build the double height (aka Kanji) lookup table, indexed by (hi << 8) | lo of the first two bytes
+	of a character.
+	
+	A slot holds the character for a two byte code, or a dict of the next two bytes
+	(as (hi << 8) | lo) to the character for a four byte code. Two byte codes are
+	looked for first, so they win if the same bytes start a four byte code.
+	"""
+	double_table = [None] * 65536
+	for size in (4, 2):
+		for byte_code in trans_table_double.keys():
+			code = _hex_bytes(byte_code)
+			if (code is None) or (len(code) != size):
+				continue
+			code = bytearray(code)
+			pair = (code[0] << 8) | code[1]
+			if size == 4:
+				if double_table[pair] is None:
+					double_table[pair] = {}
+				double_table[pair][(code[2] << 8) | code[3]] = trans_table_double[byte_code]["pre_shift"]
+			else:
+				double_table[pair] = trans_table_double[byte_code]["pre_shift"]
+	return double_table
+
+# The double height lookup table for the most recently used double height translation table
+DOUBLE_TABLE = None
+DOUBLE_TABLE_SOURCE = None
+
+def get_double_table(trans_table_double):
+	"""
+	Return the double height lookup table, reusing the last one if the translation table is the same.
+	"""
+	global DOUBLE_TABLE, DOUBLE_TABLE_SOURCE
+	if (DOUBLE_TABLE is None) or (DOUBLE_TABLE_SOURCE is not trans_table_double):
+		DOUBLE_TABLE = compiled_table("double_table", trans_table_double, lambda: compile_double_table(trans_table_double))
+		DOUBLE_TABLE_SOURCE = trans_table_double
+	return DOUBLE_TABLE
+
+def translate_double_codes(codes, double_table, start_pos = 0):
+	"""
+	translate_double_codes - construct the actual text of a run of double height (aka Kanji) byte values.
+	
+	Characters are two or four bytes long. A pair of bytes that does not start any
+	character is shown as <hi><lo> and recorded as missing at its position, and
+	decoding carries on with the next pair.
+	"""
+	new_bytes = []
+	n = len(codes)
+	i = 0
+	while i < n:
+		if (i + 1) == n:
+			# Double height strings should only ever be an even number of bytes
+			record_missing("%02X" % codes[i], MISSING_BYTES, start_pos + i)
+			new_bytes.append("<%02X>" % codes[i])
+			break
+		bt = double_table[(codes[i] << 8) | codes[i + 1]]
+		if isinstance(bt, dict):
+			if (i + 3) < n:
+				bt = bt.get((codes[i + 2] << 8) | codes[i + 3])
+				if bt is not None:
+					new_bytes.append(bt)
+					i += 4
+					continue
+			bt = None
+		if bt is None:
+			# warning - byte sequence not in table
+			record_missing("%02X%02X" % (codes[i], codes[i + 1]), MISSING_BYTES, start_pos + i)
+			new_bytes.append("<%02X><%02X>" % (codes[i], codes[i + 1]))
+		else:
+			new_bytes.append(bt)
+		i += 2
+	return new_bytes
+
+def translate_double_string(bytes, trans_table_double, alt=False):
+	"""
+	translate_double_string - construct the actual text, using multi-byte, double height (aka Kanji ideograms)
+	where appropriate.
+	"""
+	codes = hex_to_codes(bytes)
+	if codes is None:
 		if VERBOSE:
 			print("Not a valid double height string")
 		return bytes
+	return translate_double_codes(codes, get_double_table(trans_table_double))
 
-def translate_string(byte_sequence, trans_table, trans_table_double, alt=False, old_assets = True, VERBOSE = VERBOSE):
+def translate_string(byte_sequence, trans_table = None, trans_table_double = None, alt=False, old_assets = True, VERBOSE = VERBOSE):
 	"""
 	translate_string - construct the actual text, using multi-byte characters
 	where appropriate, that represent the hex codes found in the rom.
 	e.g. 0x1A 0x5F 0x76 0x61 0x62 0x63 0x64 0x65 0x00 = <control><control>vabcde<end>
 	"""
+	
+	if trans_table is None:
+		trans_table = get_table()
+	if trans_table_double is None:
+		trans_table_double = get_table_double()
 
 	#VERBOSE = True
 					
@@ -275,6 +758,17 @@ def translate_string(byte_sequence, trans_table, trans_table_double, alt=False,
 	else:
 		trailing_bytes = 0
 			
+	if (old_assets is False) and not VERBOSE:
+		# Strings from the asset files are decoded from the dispatch tables. The
+		# table search below is still used for the verbose, byte by byte trace.
+		codes = hex_to_codes(byte_sequence["bytes"])
+		if codes is not None:
+			start_pos = byte_sequence.get("start_pos", 0)
+			if not isinstance(start_pos, int):
+				start_pos = int(start_pos, 16)
+			byte_sequence[text_key] = get_decoder(trans_table, trans_table_double).decode(codes, byte_sequence["bytes"], start_pos)
+			return byte_sequence
+	
 	byte_sequence[text_key] = []
 	already_i = 0
 	kanji_on = False
@@ -362,6 +856,7 @@ def translate_string(byte_sequence, trans_table, trans_table_double, alt=False,
 							decode_it = True
 							b = b1
 					except Exception as e:
+						import traceback
 						print(traceback.format_exc())
 						print(e)
 						print("Error in string: %s" % byte_sequence)
@@ -444,6 +939,25 @@ def record_missing(b, missing_bytes, pos):
 		missing_bytes[b] = []
 		missing_bytes[b].append({'byte': b, 'pos' : pos})	
 
+def take_missing():
+	"""
+	Hand back the missing translation bytes recorded so far and start again
+	(so that a worker process can pass them back, one file at a time).
+	"""
+	missing_bytes = dict(MISSING_BYTES)
+	MISSING_BYTES.clear()
+	return missing_bytes
+
+def merge_missing(missing_bytes):
+	"""
+	Add missing translation bytes recorded somewhere else (e.g. by a worker process).
+	"""
+	for b in missing_bytes.keys():
+		if b in MISSING_BYTES.keys():
+			MISSING_BYTES[b] += missing_bytes[b]
+		else:
+			MISSING_BYTES[b] = list(missing_bytes[b])
+
 ######################################################
 
 def missing_stats():
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+"""
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+verifyAssets.py
+================
+Round-trips every translated string in the English script assets.
+
+Each PCE_english string is encoded, decoded back again and the decoded
+text is encoded a second time. A string passes if the decoded text is the
+same as the English text, or if it encodes to the same bytes (i.e. it only
+differs by an alias such as a second table entry for the same character).
+Anything else is written out as a short diff, by bank.asset.string number.
+
+The asset files are checked in parallel, one per worker process.
+
+John Snowdon <john@target-earth.net>
+"""
+
+import os
+import sys
+import getopt
+
+######################################################
+########## < Config starts here > ####################
+######################################################
+
+from config import VERBOSE
+
+from translators import get_encoder, get_decoder, translate_bytes, codes_to_hex
+from Table import get_table, get_table_double
+from AssetContainer import read_asset, asset_files, as_text
+
+ASSETS_DIR = "./assets/converted/"
+# multiprocessing is only imported when there is more than one worker
+WORKERS = 1
+if hasattr(os, "cpu_count") and os.cpu_count():
+	WORKERS = os.cpu_count()
+
+# How many bytes / characters either side of a difference to show
+CONTEXT = 12
+
+######################################################
+########## < Functions start here > ##################
+######################################################
+
+# Translation tables, loaded once in each worker
+TTABLE = None
+TTABLE2 = None
+
+def init_worker():
+	"""
+	Load the translation tables in to a worker process.
+	"""
+	global TTABLE
+	global TTABLE2
+	TTABLE = get_table()
+	TTABLE2 = get_table_double()
+
+def encode_quietly(string, string_number):
+	"""
+	Encode a string, returning the bytes (or None if it cannot be encoded) and the encoder warnings.
+	"""
+	new_bytes, warnings = get_encoder(TTABLE).try_encode_bytes(string = string, string_number = string_number)
+	# On Python 2 some warnings are byte strings, holding encoded game bytes
+	warnings = [line.decode("utf-8", "replace") if isinstance(line, bytes) else line for line in warnings]
+	return new_bytes, u"\n".join(warnings).strip()
+
+def decode(new_bytes):
+	"""
+	Decode bytes back to text, in the same form as they are written to the asset files.
+	"""
+	if len(new_bytes) == 1:
+		# translate_bytes leaves strings under two bytes undecoded
+		return as_text(get_decoder(TTABLE, TTABLE2).final[new_bytes[0]])
+	# On Python 2 the decoder gives UTF-8 byte strings
+	return u"".join([as_text(text) for text in translate_bytes(new_bytes, trans_table = TTABLE, trans_table_double = TTABLE2)])
+
+def first_difference(a, b):
+	"""
+	Index of the first element where two sequences differ.
+	"""
+	i = 0
+	while i < min(len(a), len(b)):
+		if a[i] != b[i]:
+			return i
+		i += 1
+	return i
+
+def excerpt(sequence, pos, join = ""):
+	"""
+	A short piece of a string or list around pos.
+	"""
+	start = max(0, pos - CONTEXT)
+	text = join.join(sequence[start:pos + CONTEXT])
+	if start > 0:
+		text = "..." + text
+	if pos + CONTEXT < len(sequence):
+		text = text + "..."
+	return text
+
+def verify_file(filename):
+	"""
+	Round-trip each translated string in an asset file.
+
+	Returns the asset file name, the number of strings checked and a list of
+	the strings which failed.
+	"""
+	asset = read_asset(filename, raw_bytes = True)
+	checked = 0
+	failures = []
+	for asset_chunk in asset["strings"]:
+		if len(asset_chunk["PCE_english"]) == 0:
+			continue
+		checked += 1
+		string_id = "%s.%s.%s" % (asset["bank"], asset["asset_index"], asset_chunk["string_number"])
+		english = asset_chunk["PCE_english"].replace('<GIT_REVISION>', '0')
+
+		# Step 1, encode the text
+		new_bytes, output = encode_quietly(english, asset_chunk["string_number"])
+		if new_bytes is None:
+			failures.append({
+				"id" : string_id,
+				"reason" : "does not encode",
+				"english" : excerpt(english.replace('\n', '\\n'), 0),
+				"output" : output,
+			})
+			continue
+
+		# Step 2, decode the text back again
+		text = decode(new_bytes)
+		if text.replace('\\n', '\n') == english:
+			continue
+
+		# Step 3, the text is different - does it still encode to the same bytes?
+		decoded_bytes, decoded_output = encode_quietly(text.replace('\\n', '\n'), asset_chunk["string_number"])
+		if decoded_bytes == new_bytes:
+			continue
+
+		english_hex = codes_to_hex(new_bytes)
+		pos = first_difference(english.replace('\n', '\\n'), text)
+		failure = {
+			"id" : string_id,
+			"english" : excerpt(english.replace('\n', '\\n'), pos),
+			"decoded" : excerpt(text, pos),
+		}
+		if decoded_bytes is None:
+			failure["reason"] = "decoded text does not encode"
+			failure["output"] = decoded_output
+		else:
+			byte_pos = first_difference(english_hex, codes_to_hex(decoded_bytes))
+			failure["reason"] = "bytes differ at %s" % byte_pos
+			failure["bytes"] = excerpt(english_hex, byte_pos, " ")
+			failure["decoded_bytes"] = excerpt(codes_to_hex(decoded_bytes), byte_pos, " ")
+		failures.append(failure)
+	return filename, checked, failures
+
+def print_failure(failure):
+	"""
+	Print the diff for one string.
+	"""
+	print("%s: %s" % (failure["id"], failure["reason"]))
+	for k in ["english", "decoded", "bytes", "decoded_bytes"]:
+		if k in failure:
+			print("    %-14s %s" % (k + ":", failure[k]))
+	for line in failure.get("output", "").split("\n"):
+		# Only the encoder warnings themselves, unless in verbose mode
+		if line.startswith("WARNING!") or (VERBOSE and len(line) > 0):
+			print("    %s" % line)
+
+######################################################
+########## < Run-time code start here > ##############
+######################################################
+
+if __name__ == "__main__":
+	try:
+		opts, args = getopt.getopt(sys.argv[1:], "hvd:j:")
+	except getopt.GetoptError as err:
+		print(err)
+		sys.exit(2)
+
+	print("")
+	print("verifyAssets.py - Round-trip check of the English script for Cyber Knight")
+	print("----------------")
+	print("")
+
+	for o, a in opts:
+		if o == "-h":
+			print("A tool which encodes every translated string, decodes it back again and")
+			print("reports the strings which do not survive the round trip.")
+			print("")
+			print("Options:")
+			print("-h	Show help text")
+			print("-v	Enable verbose output (show all encoder output)")
+			print("-d	Directory containing English script assets (e.g. ./assets/converted/)")
+			print("-j	Number of worker processes (default: %s)" % WORKERS)
+			print("")
+			print("Example:")
+			print("verifyAssets.py -d ./assets/converted/ -j 4")
+			print("")
+			sys.exit(0)
+
+		if o == "-v":
+			VERBOSE = True
+
+		if o == "-d":
+			ASSETS_DIR = a
+
+		if o == "-j":
+			WORKERS = int(a)
+
+	if os.path.isdir(ASSETS_DIR):
+		print("Assets Dir: %s <- OK" % ASSETS_DIR)
+	else:
+		print("Assets Dir: %s <- ERROR, directory not found!" % ASSETS_DIR)
+		sys.exit(2)
+
+	file_names = [os.path.join(ASSETS_DIR, f) for f in asset_files(ASSETS_DIR)]
+	print("Workers: %s" % WORKERS)
+	print("")
+
+	if WORKERS > 1:
+		import multiprocessing
+		pool = multiprocessing.Pool(WORKERS, initializer = init_worker)
+		results = pool.map(verify_file, file_names)
+		pool.close()
+		pool.join()
+	else:
+		init_worker()
+		results = [verify_file(filename) for filename in file_names]
+
+	total_checked = 0
+	total_failed = 0
+	for filename, checked, failures in results:
+		total_checked += checked
+		total_failed += len(failures)
+		for failure in failures:
+			print_failure(failure)
+
+	print("")
+	print("===============================")
+	print("Asset files: %s" % len(file_names))
+	print("Strings checked: %s" % total_checked)
+	print("Strings failed: %s" % total_failed)
+	if total_failed > 0:
+		sys.exit(1)